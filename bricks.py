@@ -1,11 +1,23 @@
 from typing import *
 
+import contextlib
 import random
+import time
 import scratch_exceptions
 import useful
 import pygame
 import constants
 import collections
+import functools
+import heapq
+import itertools
+import font_cache
+import hud
+import journal
+import minimap
+import palette
+import profiling
+import workspaces
 
 
 class ManipulatedByUser(pygame.Rect):
@@ -47,7 +59,7 @@ class UpdatableRect(ExpandingRect):
         raise NotImplementedError
 
     def update_location(self, x, y) -> None:
-        self.x, self.y = x, y
+        self.translate(x - self.x, y - self.y)
 
     def update_size(self) -> None:
         raise NotImplementedError
@@ -56,6 +68,25 @@ class UpdatableRect(ExpandingRect):
         self.update_size()
         self.calculate_full_content_rect()
 
+    def child_rects(self) -> List['UpdatableRect']:
+        return []
+
+    def translate(self, dx: int, dy: int) -> None:
+        # Moves an already laid out subtree without laying it out again
+        self.move_ip(dx, dy)
+        self.full_content_rect.move_ip(dx, dy)
+
+        for child in self.child_rects():
+            child.translate(dx, dy)
+
+    def copy_layout(self, source: 'UpdatableRect', dx: int, dy: int) -> None:
+        # Takes the geometry of a laid out subtree of the same structure
+        self.update(source.move(dx, dy))
+        self.full_content_rect = ExpandingRect(source.full_content_rect.move(dx, dy))
+
+        for child, source_child in zip(self.child_rects(), source.child_rects()):
+            child.copy_layout(source_child, dx, dy)
+
     def draw(self, surface: pygame.Surface, is_selected: bool) -> None:
         raise NotImplementedError
 
@@ -81,6 +112,7 @@ class Block(UpdatableRect, ManipulatedByUser):
         self.app: 'App' = app
         self.owner: Optional['BlockSpot'] = None
         self.depth: int = self.app.get_current_top_depth()
+        self.block_id: int = self.app.get_new_block_id()
 
     def calculate_full_content_rect(self) -> None:
         self.full_content_rect = ExpandingRect(self.x, self.y, self.width, self.height)
@@ -94,14 +126,50 @@ class Block(UpdatableRect, ManipulatedByUser):
     def update_size(self) -> None:
         pass
 
-    def is_recursive_contain_block_spot(self, block_spot: 'BlockSpot') -> bool:
-        return False
+    def get_parent(self) -> Optional['Block']:
+        if self.owner is not None:
+            return self.owner.owner
+
+        return None
+
+    def get_root(self) -> 'Block':
+        block = self
+        parent = block.get_parent()
+
+        while parent is not None:
+            block, parent = parent, parent.get_parent()
+
+        return block
+
+    def child_spots(self) -> List['BlockSpot']:
+        return []
+
+    def iterate_subtree(self) -> Iterator['Block']:
+        yield self
+
+        for block_spot in self.child_spots():
+            if block_spot.inner is not None:
+                yield from block_spot.inner.iterate_subtree()
+
+    def register(self) -> None:
+        for block_spot in self.child_spots():
+            self.app.add_new_block_spot(block_spot)
+
+    def unregister(self) -> None:
+        self.app.remove_block_spots(self.child_spots())
+
+    def recycle(self, x: int, y: int) -> None:
+        self.update_location(x, y)
+        self.owner = None
+        self.depth = self.app.get_current_top_depth()
+        self.block_id = self.app.get_new_block_id()
 
     def keyboard_press(self, key: int) -> None:
         pass
 
     def relative_move(self, dx: int, dy: int) -> None:
-        self.update_location(self.x + dx, self.y + dy)
+        self.translate(dx, dy)
+        self.app.minimap.mark_dirty(self)
 
 
 class BlockSpot(UpdatableRect):
@@ -118,30 +186,38 @@ class BlockSpot(UpdatableRect):
 
         self.app.add_new_block_spot(self)
 
-    def is_recursive_contain_block_spot(self, block_spot: 'BlockSpot') -> bool:
-        if self is block_spot:
-            return True
+    def is_inside(self, block: Block) -> bool:
+        # Walks the owner links up to the top level block, so the cost depends
+        # on the nesting depth of this spot and not on the size of `block`
+        ancestor = self.owner
 
-        if self.inner:
-            return self.inner.is_recursive_contain_block_spot(block_spot)
+        while ancestor is not None:
+            if ancestor is block:
+                return True
+
+            ancestor = ancestor.get_parent()
 
         return False
 
     def update_depth(self):
-        if self.inner:
+        if self.inner is not None:
             self.inner.update_depth()
 
     def calculate_full_content_rect(self) -> None:
         self.full_content_rect = ExpandingRect(self.x, self.y, self.width, self.height)
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
         return True
 
+    def check_other_insert_conditions(self, block: Block) -> bool:
+        return type(self) in get_compatible_spot_types(type(block))
+
     def can_insert(self, block: Block, cursor_x: int, cursor_y: int) -> bool:
-        if self.inner:
+        if self.inner is not None:
             return False
 
-        if block.is_recursive_contain_block_spot(self):
+        if self.is_inside(block):
             return False
 
         if self.collidepoint(cursor_x, cursor_y) and self.check_other_insert_conditions(block):
@@ -149,24 +225,42 @@ class BlockSpot(UpdatableRect):
 
         return False
 
+    def child_rects(self) -> List[UpdatableRect]:
+        if self.inner is not None:
+            return [self.inner]
+
+        return []
+
+    def get_index(self) -> int:
+        return useful.index_by_identity(self.owner.child_spots(), self)
+
     def insert(self, block: Block) -> None:
         assert self.inner is None
         self.inner = block
         self.update_location(self.x, self.y)
         block.owner = self
+        self.app.mark_changed(self.owner)
+
+        self.app.record_edit([journal.OP_INSERT, self.owner.block_id, self.get_index(), block.block_id])
 
     def extract(self) -> None:
-        if self.inner:
+        if self.inner is not None:
             self.inner.owner = None
+            self.app.mark_changed(self.inner)
+            self.app.record_edit([journal.OP_EXTRACT, self.owner.block_id, self.get_index()])
         self.inner = None
+        self.app.mark_changed(self.owner)
 
     def update_location(self, x: int, y: int) -> None:
-        self.x, self.y = x, y
-        if self.inner:
+        dx, dy = x - self.x, y - self.y
+        self.move_ip(dx, dy)
+        self.full_content_rect.move_ip(dx, dy)
+
+        if self.inner is not None:
             self.inner.update_location(x, y)
 
     def update_size(self) -> None:
-        if self.inner:
+        if self.inner is not None:
             self.inner.update_all()
             inner_size = self.inner.full_content_rect
 
@@ -176,24 +270,40 @@ class BlockSpot(UpdatableRect):
             self.width = self.default_width
             self.height = self.default_height
 
+    def draw_drop_highlight(self, surface: pygame.Surface, is_hovered: bool) -> None:
+        pygame.draw.rect(surface, constants.DROP_TARGET_COLOR, (self.x, self.y, self.width, self.height),
+                         3 if is_hovered else 1)
+
     def draw(self, surface: pygame.Surface, is_selected: bool) -> None:
         #pygame.draw.rect(surface, (255, 255, 255), (self.x, self.y, self.width, self.height), 1)
         # pygame.draw.rect(surface, (255, 255, 255), (self.x - 1, self.y - 1, self.width + 2, self.height + 2), 3)
 
-        if self.inner:
+        if self.inner is not None:
             self.inner.draw(surface, False)
 
 
+def get_all_subclasses(base_type: type) -> Iterator[type]:
+    for subclass in base_type.__subclasses__():
+        yield subclass
+        yield from get_all_subclasses(subclass)
+
+
+@functools.lru_cache(maxsize=None)
+def get_compatible_spot_types(block_type: Type[Block]) -> FrozenSet[Type[BlockSpot]]:
+    return frozenset(spot_type for spot_type in (BlockSpot, *get_all_subclasses(BlockSpot))
+                     if spot_type.accepts_block_type(block_type))
+
+
 class TextBlock(Block):
 
     def __init__(self, app: 'App', x: int, y: int, text: str, text_color: Tuple[float, float, float] = (0, 0, 0)):
         super().__init__(app, x, y, 0, 0)
 
         self.text_color = text_color
-        self.text_surface = self.app.default_in_block_font.render(text, True, self.text_color)
+        self.text_surface = self.app.render_text(text, self.text_color)
 
     def set_text(self, text):
-        self.text_surface = self.app.default_in_block_font.render(text, True, self.text_color)
+        self.text_surface = self.app.render_text(text, self.text_color)
 
     def update_size(self) -> None:
         self.width = self.text_surface.get_width()
@@ -288,97 +398,879 @@ class GridBlock(Block):
     def update_size(self) -> None:
         self.calculate_content()
 
-    def is_recursive_contain_block_spot(self, block_spot: 'BlockSpot') -> bool:
-        for single_inner in self.content:
-            if single_inner['instance'].is_recursive_contain_block_spot(block_spot):
-                return True
+    def child_rects(self) -> List[UpdatableRect]:
+        return [single_inner['instance'] for single_inner in self.content]
 
-        return False
+    def child_spots(self) -> List['BlockSpot']:
+        return [single_inner['instance'] for single_inner in self.content
+                if isinstance(single_inner['instance'], BlockSpot)]
+
+
+# Block type, typed text and the templates of the inner blocks by spot index
+BlockTemplate = Tuple[Type[Block], Optional[str], List[Tuple[int, 'BlockTemplate']]]
 
 
 class VariableScope:
+    # Versions are unique over all scopes, so a value computed in one procedure
+    # call is never taken as valid in another one
+    version_counter: Iterator[int] = itertools.count(1)
 
-    def __init__(self):
+    def __init__(self, parent: Optional['VariableScope'] = None):
         self.variables: dict[str, Any] = {}
+        self.parent: Optional[VariableScope] = parent
 
-    def set_variable(self, var_name: str, value: Any) -> None:
+        # Every write gives the variable a new version, reads made while
+        # `read_log` is set are logged with the version they saw
+        self.versions: Dict[str, int] = {}
+        self.read_log: Optional[Dict[str, int]] = None
+
+    def find_scope(self, var_name: str) -> Optional['VariableScope']:
+        variable_scope = self
+
+        while variable_scope is not None:
+            if var_name in variable_scope.variables:
+                return variable_scope
+            variable_scope = variable_scope.parent
+
+        return None
+
+    def get_version(self, var_name: str) -> int:
+        variable_scope = self.find_scope(var_name)
+        if variable_scope is None:
+            return 0
+
+        return variable_scope.versions[var_name]
+
+    def define_variable(self, var_name: str, value: Any) -> None:
         self.variables[var_name] = value
+        self.versions[var_name] = next(self.version_counter)
+
+    def set_variable(self, var_name: str, value: Any) -> None:
+        # Existing variables are written where they live, new ones are local
+        variable_scope = self.find_scope(var_name)
+        if variable_scope is None:
+            variable_scope = self
+
+        variable_scope.define_variable(var_name, value)
 
     def get_variable(self, var_name: str) -> Any:
-        try:
-            return self.variables[var_name]
-        except KeyError:
-            raise scratch_exceptions.InvalidVariableNameException
+        variable_scope = self.find_scope(var_name)
+
+        if self.read_log is not None:
+            self.read_log[var_name] = variable_scope.versions[var_name] if variable_scope is not None else 0
+
+        if variable_scope is None:
+            raise scratch_exceptions.InvalidVariableNameException(var_name)
+
+        return variable_scope.variables[var_name]
+
+
+class CallFrame:
+
+    def __init__(self, procedure: 'DefineProcedureBrick', variable_scope: VariableScope,
+                 return_bricks: List['Brick']):
+        self.procedure: DefineProcedureBrick = procedure
+        self.variable_scope: VariableScope = variable_scope
+        self.return_bricks: List[Brick] = return_bricks
+
+
+class Continuation:
+    # Everything a suspended script needs to go on from where it stopped
+
+    def __init__(self, bricks: List['Brick'], call_stack: List[CallFrame], variable_scope: VariableScope):
+        self.bricks: List[Brick] = bricks
+        self.call_stack: List[CallFrame] = call_stack
+        self.variable_scope: VariableScope = variable_scope
+
+
+class ValueMemo:
+
+    def __init__(self, value: Any, error: Optional[Exception], dependencies: Dict[str, int]):
+        self.value: Any = value
+        self.error: Optional[Exception] = error
+        self.dependencies: Dict[str, int] = dependencies
+        self.label_surface: Optional[pygame.Surface] = None
+
+    def is_valid(self, variable_scope: VariableScope) -> bool:
+        return all(variable_scope.get_version(var_name) == version
+                   for var_name, version in self.dependencies.items())
+
+    def get_label(self) -> str:
+        if self.error is not None:
+            return '?'
+
+        if isinstance(self.value, bool):
+            return 'true' if self.value else 'false'
+
+        return str(self.value)
+
+
+def report_io_error(future: 'concurrent.futures.Future') -> None:
+    # Writes handed to the I/O thread would otherwise fail without a trace
+    if future.exception() is not None:
+        print('Background write failed:', repr(future.exception()))
 
 
 class App:
     class QuitException(Exception):
         pass
 
-    def __init__(self, width: int, height: int, fps: int):
+    def __init__(self, width: int, height: int, fps: int,
+                 startup_profiler: Optional[profiling.StartupProfiler] = None,
+                 edit_journal: Optional[journal.EditJournal] = None,
+                 event_recorder: Optional['replay.EventRecorder'] = None,
+                 tracer: Optional['tracing.ExecutionTracer'] = None):
         self.width: int = width
         self.height: int = height
         self.fps: int = fps
 
-        self.default_in_block_font: pygame.font.Font = pygame.font.SysFont('Consolas', 16)
+        self.startup_profiler: Optional[profiling.StartupProfiler] = startup_profiler
+
+        self.edit_journal: Optional[journal.EditJournal] = edit_journal
+        self.is_replaying_edits: bool = False
+
+        self.event_recorder: Optional['replay.EventRecorder'] = event_recorder
+        self.frame_number: int = 0
+        self.phase_timer: profiling.PhaseTimer = profiling.PhaseTimer(constants.FRAME_TIMER_WINDOW)
+        self.frame_metrics_writer: Optional[profiling.FrameMetricsWriter] = None
+        self.last_report_time: float = 0
+        self.idle_tracker: profiling.IdleTracker = profiling.IdleTracker(time.perf_counter())
+
+        self.metrics_server: Optional['metrics_server.MetricsServer'] = None
+        self.steps_executed: int = 0
+        self.runtime_errors: int = 0
+        self.last_metrics_time: float = time.perf_counter()
+        self.last_metrics_steps: int = 0
+
+        # Set only by run_async, file writes then happen on this thread instead of the frame loop
+        self.io_executor: Optional['concurrent.futures.Executor'] = None
+        self.is_loading: bool = False
+        self.loading_progress: float = 0
+
+        self.tracer: Optional['tracing.ExecutionTracer'] = tracer
+        self.checkpoint_path: Optional[str] = None
+
+        self.default_in_block_font: pygame.font.Font = font_cache.load_font(constants.DEFAULT_FONT_NAME,
+                                                                            constants.DEFAULT_FONT_SIZE)
+        self.mark_startup('font lookup')
 
-        self.variable_scope: VariableScope = VariableScope()
+        # Rendered text by (text, color), shared by all blocks showing the same
+        # text and kept in least recently used order
+        self.text_surfaces: collections.OrderedDict[Tuple[str, Tuple[int, ...]], pygame.Surface] \
+            = collections.OrderedDict()
+
+        self.hud: hud.FrameHud = hud.FrameHud(self.default_in_block_font)
+
+        self.preview_font: pygame.font.Font = font_cache.load_font(constants.DEFAULT_FONT_NAME,
+                                                                   constants.PREVIEW_FONT_SIZE)
+        self.show_value_previews: bool = True
+        self.value_cache_hits: int = 0
+        self.value_cache_misses: int = 0
+
+        # `variable_scope` is the scope of the running procedure call, or the
+        # global one outside of procedures
+        self.global_scope: VariableScope = VariableScope()
+        self.variable_scope: VariableScope = self.global_scope
 
         self.selected_block: Optional[Block] = None
         self.dragged_block: Optional[Block] = None
+        self.drag_start_location: Tuple[int, int] = (0, 0)
+        self.drop_candidates: List[BlockSpot] = []
+        self.cursor_location: Tuple[int, int] = (0, 0)
         self.current_top_depth = 0
+        self.current_block_id = 0
 
         self.blocks: List[Block] = []
         self.block_spots: List[BlockSpot] = []
+        self.collected_block_spots: Optional[List[BlockSpot]] = None
+        # While a deletion is in progress, ids of the blocks and spots it removed
+        self.removed_ids: Optional[Set[int]] = None
+        self.layout_dirty_blocks: Dict[int, Block] = {}
+
+        self.minimap: minimap.Minimap = minimap.Minimap(self)
+        self.block_pool: palette.BlockPool = palette.BlockPool(self)
+        self.palette: palette.Palette = palette.Palette(self, PALETTE_BLOCK_TYPES)
+
+        first_directory = edit_journal.directory if edit_journal else None
+        self.workspaces: List[workspaces.Workspace] = [
+            workspaces.Workspace(workspaces.get_workspace_name(first_directory, 0), edit_journal)]
+        self.active_workspace_index: int = 0
+        self.tab_bar: workspaces.TabBar = workspaces.TabBar(self)
 
         self.event_handlers: collections.defaultdict[constants.TriggeredEvent, List['EventBrick']] \
             = collections.defaultdict(list)
 
+        self.procedure_definitions: List['DefineProcedureBrick'] = []
+
         self.triggered_events: List[constants.TriggeredEvent] = []
         self.executing_bricks: List['Brick'] = []
+        self.call_stack: List[CallFrame] = []
+        self.recursion_limit: int = constants.RECURSION_LIMIT
+
+        # Scripts run one at a time, the others wait in the ready queue. Sleeping
+        # ones are kept in a heap of (wake time, sequence number, continuation).
+        self.ready_continuations: collections.deque[Continuation] = collections.deque()
+        self.sleeping_continuations: List[Tuple[float, int, Continuation]] = []
+        self.sleep_sequence: Iterator[int] = itertools.count()
+
+    def mark_startup(self, phase_name: str) -> None:
+        if self.startup_profiler:
+            self.startup_profiler.mark(phase_name)
 
     def get_current_top_depth(self):
         self.current_top_depth += 1
         return self.current_top_depth
 
+    def get_new_block_id(self) -> int:
+        self.current_block_id += 1
+        return self.current_block_id
+
+    def render_text(self, text: str, color: Tuple[int, ...]) -> pygame.Surface:
+        key = (text, tuple(color))
+
+        if key in self.text_surfaces:
+            self.text_surfaces.move_to_end(key)
+            return self.text_surfaces[key]
+
+        text_surface = self.default_in_block_font.render(text, True, color)
+        self.text_surfaces[key] = text_surface
+
+        if len(self.text_surfaces) > constants.TEXT_SURFACE_CACHE_SIZE:
+            self.text_surfaces.popitem(last=False)
+
+        return text_surface
+
+    def record_edit(self, record: List[Any]) -> None:
+        if not self.edit_journal or self.is_replaying_edits:
+            return
+
+        self.edit_journal.append(record)
+
+        if self.edit_journal.needs_compaction():
+            self.edit_journal.compact(self.make_snapshot())
+
+    def mark_changed(self, block: Block) -> None:
+        # Called whenever a subtree is edited. Cached values of the block and of
+        # every expression containing it are dropped, and its top level block
+        # is laid out again on the next frame.
+        root = block
+
+        while True:
+            if isinstance(root, ReturnsValue):
+                root.value_memo = None
+
+            parent = root.get_parent()
+            if parent is None:
+                break
+            root = parent
+
+        self.layout_dirty_blocks[id(root)] = root
+        self.minimap.mark_dirty(block)
+        self.minimap.mark_dirty(root)
+
+    def pan_view(self, dx: int, dy: int) -> None:
+        # There is no camera, the whole workspace moves instead
+        for block in self.blocks:
+            if block.owner is None:
+                block.translate(dx, dy)
+
+        self.minimap.pan(dx, dy)
+        self.record_edit([journal.OP_PAN, dx, dy])
+
+    def add_block(self, block: Block) -> None:
+        self.blocks.append(block)
+        self.mark_changed(block)
+        self.record_edit([journal.OP_SPAWN, block.block_id, type(block).__name__, block.x, block.y])
+
+    def spawn_block(self, block_type: Type[Block], x: int, y: int) -> Block:
+        block = self.block_pool.acquire(block_type, x, y)
+        self.add_block(block)
+
+        return block
+
+    def make_block_template(self, block: Block) -> BlockTemplate:
+        text = block.text if isinstance(block, TypedTextBlock) else None
+        children = [(index, self.make_block_template(block_spot.inner))
+                    for index, block_spot in enumerate(block.child_spots()) if block_spot.inner is not None]
+
+        return type(block), text, children
+
+    def build_from_template(self, template: BlockTemplate, x: int, y: int, block_ids: Iterator[int]) -> Block:
+        # Inner blocks are linked directly, without the layout and journal
+        # bookkeeping of insert, duplicate_block does that once for the copy
+        block_type, text, children = template
+
+        block = self.block_pool.acquire(block_type, x, y)
+        block.block_id = next(block_ids)
+        if text is not None:
+            block.text = text
+        if isinstance(block, ReturnsValue):
+            block.value_memo = None
+        self.blocks.append(block)
+
+        child_spots = block.child_spots()
+        for index, child_template in children:
+            inner = self.build_from_template(child_template, x, y, block_ids)
+            child_spots[index].inner = inner
+            inner.owner = child_spots[index]
+
+        return block
+
+    @contextlib.contextmanager
+    def collecting_block_spots(self) -> Iterator[None]:
+        # New spots are added to `block_spots` all at once at the end
+        self.collected_block_spots = []
+
+        try:
+            yield
+        finally:
+            self.block_spots.extend(self.collected_block_spots)
+            self.collected_block_spots = None
+
+    def duplicate_block(self, block: Block, x: int, y: int, first_block_id: Optional[int] = None) -> Block:
+        # The copy gets consecutive block ids in template order, so the single
+        # journal record rebuilds it with the same ids
+        if first_block_id is None:
+            first_block_id = self.current_block_id + 1
+        block_ids = itertools.count(first_block_id)
+
+        with self.collecting_block_spots():
+            copy = self.build_from_template(self.make_block_template(block), x, y, block_ids)
+
+        self.current_block_id = max(self.current_block_id, next(block_ids) - 1)
+
+        if id(block.get_root()) in self.layout_dirty_blocks:
+            self.mark_changed(copy)
+        else:
+            # A copy of a laid out subtree needs no layout pass of its own
+            copy.copy_layout(block, x - block.x, y - block.y)
+            self.minimap.mark_dirty(copy)
+        self.record_edit([journal.OP_DUPLICATE, block.block_id, first_block_id, x, y])
+
+        return copy
+
+    @contextlib.contextmanager
+    def removing_in_bulk(self) -> Iterator[None]:
+        # Deleted blocks and spots are taken out of `blocks` and `block_spots`
+        # in one pass at the end instead of one pass each
+        if self.removed_ids is not None:
+            yield
+            return
+
+        self.removed_ids = set()
+
+        try:
+            yield
+        finally:
+            removed_ids, self.removed_ids = self.removed_ids, None
+            self.blocks = [block for block in self.blocks if id(block) not in removed_ids]
+            self.block_spots = [block_spot for block_spot in self.block_spots if id(block_spot) not in removed_ids]
+
+    def delete_block(self, block: Block) -> None:
+        self.discard_scripts_using({id(deleted) for deleted in block.iterate_subtree()})
+
+        with self.removing_in_bulk():
+            self.release_subtree(block)
+
+    def release_subtree(self, block: Block) -> None:
+        for block_spot in block.child_spots():
+            inner = block_spot.inner
+
+            if inner is not None:
+                block_spot.extract()
+                self.release_subtree(inner)
+
+        self.removed_ids.add(id(block))
+        self.minimap.mark_removed(block)
+        self.record_edit([journal.OP_DELETE, block.block_id])
+        self.block_pool.release(block)
+
+    def discard_scripts_using(self, block_ids: Set[int]) -> None:
+        # A script that would still run a deleted brick, or return into one,
+        # is stopped, deleted bricks go back to the pool and may be reused
+        def uses_blocks(continuation: Continuation) -> bool:
+            used = [*continuation.bricks]
+            for frame in continuation.call_stack:
+                used.append(frame.procedure)
+                used.extend(frame.return_bricks)
+
+            return any(id(brick) in block_ids for brick in used)
+
+        if uses_blocks(Continuation(self.executing_bricks, self.call_stack, self.variable_scope)):
+            self.executing_bricks = []
+            self.reset_call_stack()
+
+        self.ready_continuations = collections.deque(continuation for continuation in self.ready_continuations
+                                                     if not uses_blocks(continuation))
+
+        self.sleeping_continuations = [entry for entry in self.sleeping_continuations if not uses_blocks(entry[2])]
+        heapq.heapify(self.sleeping_continuations)
+
+    def make_snapshot(self) -> Dict[str, Any]:
+        blocks = []
+        links = []
+
+        # A snapshot taken in the middle of a deletion leaves out what it removed so far
+        removed_ids = self.removed_ids or set()
+
+        for block in sorted(self.blocks, key=lambda b: b.block_id):
+            if id(block) in removed_ids:
+                continue
+
+            blocks.append([block.block_id, type(block).__name__, block.x, block.y, block.depth,
+                           block.text if isinstance(block, TypedTextBlock) else None])
+
+            for index, block_spot in enumerate(block.child_spots()):
+                if block_spot.inner is not None:
+                    links.append([block.block_id, index, block_spot.inner.block_id])
+
+        return {'blocks': blocks, 'links': links}
+
+    def restore_block(self, block_id: int, type_name: str, x: int, y: int) -> Block:
+        block = self.block_pool.acquire(BLOCK_TYPES[type_name], x, y)
+        block.block_id = block_id
+        self.current_block_id = max(self.current_block_id, block_id)
+        self.blocks.append(block)
+        self.mark_changed(block)
+
+        return block
+
+    def restore_snapshot_block(self, entry: List[Any], blocks_by_id: Dict[int, Block]) -> None:
+        block_id, type_name, x, y, depth, text = entry
+
+        block = self.restore_block(block_id, type_name, x, y)
+        block.depth = depth
+        self.current_top_depth = max(self.current_top_depth, depth)
+
+        if text is not None:
+            block.text = text
+        blocks_by_id[block_id] = block
+
+    def restore_snapshot_link(self, link: List[int], blocks_by_id: Dict[int, Block]) -> None:
+        owner_id, index, inner_id = link
+        blocks_by_id[owner_id].child_spots()[index].insert(blocks_by_id[inner_id])
+
+    def replay_edit(self, record: List[Any], blocks_by_id: Dict[int, Block]) -> None:
+        op = record[0]
+
+        if op == journal.OP_SPAWN:
+            _, block_id, type_name, x, y = record
+            blocks_by_id[block_id] = self.restore_block(block_id, type_name, x, y)
+
+        elif op == journal.OP_MOVE:
+            _, block_id, x, y = record
+            block = blocks_by_id[block_id]
+            block.translate(x - block.x, y - block.y)
+            block.update_depth()
+            self.minimap.mark_dirty(block)
+
+        elif op == journal.OP_INSERT:
+            _, owner_id, index, inner_id = record
+            blocks_by_id[owner_id].child_spots()[index].insert(blocks_by_id[inner_id])
+
+        elif op == journal.OP_EXTRACT:
+            _, owner_id, index = record
+            blocks_by_id[owner_id].child_spots()[index].extract()
+
+        elif op == journal.OP_TEXT:
+            _, block_id, text = record
+            blocks_by_id[block_id].text = text
+            self.mark_changed(blocks_by_id[block_id])
+
+        elif op == journal.OP_DELETE:
+            _, block_id = record
+            self.delete_block(blocks_by_id.pop(block_id))
+
+        elif op == journal.OP_PAN:
+            _, dx, dy = record
+            self.pan_view(dx, dy)
+
+        elif op == journal.OP_DUPLICATE:
+            _, block_id, first_block_id, x, y = record
+            copy = self.duplicate_block(blocks_by_id[block_id], x, y, first_block_id)
+
+            for block in copy.iterate_subtree():
+                blocks_by_id[block.block_id] = block
+
+    def restore_workspace(self) -> bool:
+        snapshot, records = self.edit_journal.load()
+        if snapshot is None and not records:
+            return False
+
+        self.load_workspace(snapshot, records)
+        return True
+
+    def load_workspace_in_chunks(self, snapshot: Optional[Dict[str, Any]], records: List[List[Any]],
+                                 chunk_size: Optional[int] = None) -> Iterator[float]:
+        # Yields the loaded fraction after every chunk, so a caller can draw
+        # frames in between
+        blocks_by_id: Dict[int, Block] = {}
+        steps: List[Callable[[], None]] = []
+
+        if snapshot:
+            steps += [functools.partial(self.restore_snapshot_block, entry, blocks_by_id)
+                      for entry in snapshot['blocks']]
+            steps += [functools.partial(self.restore_snapshot_link, link, blocks_by_id)
+                      for link in snapshot['links']]
+
+        steps += [functools.partial(self.replay_edit, record, blocks_by_id) for record in records]
+        chunk_size = chunk_size or max(len(steps), 1)
+
+        for chunk_start in range(0, len(steps), chunk_size):
+            self.is_replaying_edits = True
+
+            try:
+                for step in steps[chunk_start: chunk_start + chunk_size]:
+                    step()
+
+            finally:
+                self.is_replaying_edits = False
+
+            yield min(chunk_start + chunk_size, len(steps)) / len(steps)
+
+    def load_workspace(self, snapshot: Optional[Dict[str, Any]], records: List[List[Any]]) -> None:
+        for _ in self.load_workspace_in_chunks(snapshot, records):
+            pass
+
+    async def restore_workspace_async(self) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        snapshot, records = await loop.run_in_executor(self.io_executor, self.edit_journal.load)
+
+        self.is_loading = True
+        try:
+            for progress in self.load_workspace_in_chunks(snapshot, records, constants.LOAD_CHUNK_SIZE):
+                self.loading_progress = progress
+                await asyncio.sleep(0)
+
+        finally:
+            self.is_loading = False
+
+        self.edit_journal.start()
+        self.mark_startup('workspace restored')
+
+        if self.event_recorder:
+            self.event_recorder.start(self.make_snapshot())
+
+    def make_checkpoint(self) -> Dict[str, Any]:
+        # Bricks are stored by block id and scopes by their index in `scopes`,
+        # index 0 being the global scope. Sleeping scripts keep the time they
+        # have left, as clocks do not carry over to another process.
+        scope_indexes: Dict[int, int] = {}
+        scopes: List[List[Any]] = []
+
+        def get_scope_index(variable_scope: VariableScope) -> int:
+            if id(variable_scope) not in scope_indexes:
+                parent_index = None
+                if variable_scope.parent is not None:
+                    parent_index = get_scope_index(variable_scope.parent)
+
+                scope_indexes[id(variable_scope)] = len(scopes)
+                scopes.append([parent_index, dict(variable_scope.variables)])
+
+            return scope_indexes[id(variable_scope)]
+
+        def encode(continuation: Continuation) -> Dict[str, Any]:
+            return {'bricks'    : [brick.block_id for brick in continuation.bricks],
+                    'call_stack': [[frame.procedure.block_id, get_scope_index(frame.variable_scope),
+                                    [brick.block_id for brick in frame.return_bricks]]
+                                   for frame in continuation.call_stack],
+                    'scope'     : get_scope_index(continuation.variable_scope)}
+
+        get_scope_index(self.global_scope)
+        now = time.perf_counter()
+
+        return {'workspace'       : self.make_snapshot(),
+                'running'         : encode(Continuation(self.executing_bricks, self.call_stack, self.variable_scope)),
+                'ready'           : [encode(continuation) for continuation in self.ready_continuations],
+                'sleeping'        : [[max(wake_time - now, 0), encode(continuation)]
+                                     for wake_time, _, continuation in sorted(self.sleeping_continuations)],
+                'triggered_events': [event_name.name for event_name in self.triggered_events],
+                'scopes'          : scopes}
+
+    def restore_checkpoint(self, saved: Dict[str, Any]) -> None:
+        import checkpoint
+
+        checkpoint.check_block_ids(saved)
+
+        self.load_workspace(saved['workspace'], [])
+        blocks_by_id = {block.block_id: block for block in self.blocks}
+
+        scopes: List[VariableScope] = []
+        for i, (parent_index, variables) in enumerate(saved['scopes']):
+            variable_scope = self.global_scope if i == 0 else VariableScope(scopes[parent_index])
+
+            for var_name, value in variables.items():
+                variable_scope.define_variable(var_name, value)
+            scopes.append(variable_scope)
+
+        def decode(encoded: Dict[str, Any]) -> Continuation:
+            return Continuation([blocks_by_id[block_id] for block_id in encoded['bricks']],
+                                [CallFrame(blocks_by_id[procedure_id], scopes[scope_index],
+                                           [blocks_by_id[block_id] for block_id in return_ids])
+                                 for procedure_id, scope_index, return_ids in encoded['call_stack']],
+                                scopes[encoded['scope']])
+
+        self.resume(decode(saved['running']))
+        self.ready_continuations = collections.deque(decode(encoded) for encoded in saved['ready'])
+
+        now = time.perf_counter()
+        self.sleeping_continuations = []
+        for remaining, encoded in saved['sleeping']:
+            heapq.heappush(self.sleeping_continuations, (now + remaining, next(self.sleep_sequence), decode(encoded)))
+
+        self.triggered_events = [constants.TriggeredEvent[name] for name in saved['triggered_events']]
+
+    def save_checkpoint(self) -> None:
+        import checkpoint
+
+        path = self.checkpoint_path
+        saved = self.make_checkpoint()
+
+        def write() -> None:
+            try:
+                checkpoint.write_checkpoint(path, saved)
+            except OSError as e:
+                print('Could not write checkpoint to {}: {}'.format(path, e))
+                return
+
+            print('Checkpoint written to', path)
+
+        self.run_io(write)
+
+    def add_workspace(self, edit_journal: Optional[journal.EditJournal] = None) -> workspaces.Workspace:
+        directory = edit_journal.directory if edit_journal else None
+        workspace = workspaces.Workspace(workspaces.get_workspace_name(directory, len(self.workspaces)), edit_journal)
+        self.workspaces.append(workspace)
+
+        return workspace
+
+    def new_workspace(self) -> None:
+        edit_journal = None
+        directories = [workspace.edit_journal.directory for workspace in self.workspaces if workspace.edit_journal]
+
+        if directories:
+            edit_journal = journal.EditJournal(workspaces.get_new_workspace_directory(directories[0], directories))
+
+        self.add_workspace(edit_journal)
+        self.switch_workspace(len(self.workspaces) - 1)
+
+    def clear_workspace(self) -> None:
+        # Scripts are dropped first, so deleting the blocks has none to stop
+        self.global_scope = self.variable_scope = VariableScope()
+        self.executing_bricks = []
+        self.call_stack = []
+        self.ready_continuations = collections.deque()
+        self.sleeping_continuations = []
+        self.triggered_events = []
+
+        # Blocks go to the pool without journaling their deletion, the workspace
+        # is only put away, not edited
+        self.is_replaying_edits = True
+
+        try:
+            with self.removing_in_bulk():
+                for block in [block for block in self.blocks if block.owner is None]:
+                    self.delete_block(block)
+
+        finally:
+            self.is_replaying_edits = False
+
+        self.layout_dirty_blocks = {}
+        self.selected_block = self.dragged_block = None
+        self.drop_candidates = []
+
+        self.current_block_id = 0
+        self.current_top_depth = 0
+        self.minimap.reset()
+
+    def activate_workspace(self, workspace: workspaces.Workspace, saved: Optional[Dict[str, Any]] = None) -> None:
+        self.edit_journal = workspace.edit_journal
+
+        if saved is not None:
+            self.restore_checkpoint(saved)
+            workspace.saved_state = None
+        elif self.edit_journal:
+            self.restore_workspace()
+
+        if self.edit_journal:
+            self.edit_journal.start()
+
+    def switch_workspace(self, index: int) -> None:
+        import checkpoint
+
+        if index == self.active_workspace_index or self.is_loading:
+            return
+
+        # Checked before anything is torn down, a broken workspace is not opened
+        saved = None
+        if self.workspaces[index].saved_state is not None:
+            try:
+                saved = checkpoint.decode_checkpoint(self.workspaces[index].saved_state)
+            except ValueError as e:
+                print('Cannot open {}: {}'.format(self.workspaces[index].name, e))
+                return
+
+        # Running scripts, variables and sleeping timers are put away with the
+        # blocks, the workspace continues where it was when switched back to
+        workspace = self.workspaces[self.active_workspace_index]
+        workspace.saved_state = checkpoint.encode_checkpoint(self.make_checkpoint())
+
+        if self.edit_journal:
+            self.edit_journal.close()
+        self.clear_workspace()
+
+        self.active_workspace_index = index
+        self.activate_workspace(self.workspaces[index], saved)
+
+        # Pooled blocks and cached text were reused by the restore where
+        # possible, the rest belonged to the old workspace only
+        self.block_pool.clear()
+        self.text_surfaces.clear()
+
+    def run_io(self, function: Callable[[], Any]) -> None:
+        if self.io_executor:
+            self.io_executor.submit(function).add_done_callback(report_io_error)
+        else:
+            function()
+
+    def dump_trace(self) -> None:
+        import tracing
+
+        # The buffer is copied right away, only the write may happen later
+        path = self.tracer.dump_path
+        data = self.tracer.serialize()
+
+        def write() -> None:
+            tracing.write_dump(path, data)
+            print('Trace written to', path)
+
+        self.run_io(write)
+
     @property
     def depth_sorted_blocks(self):
         return sorted(self.blocks, key=lambda block: block.depth, reverse=True)
 
     def add_new_block_spot(self, new_block_spot: BlockSpot) -> None:
-        self.block_spots.append(new_block_spot)
+        if self.collected_block_spots is not None:
+            self.collected_block_spots.append(new_block_spot)
+        else:
+            self.block_spots.append(new_block_spot)
+
+    def remove_block_spots(self, removed_block_spots: List[BlockSpot]) -> None:
+        with self.removing_in_bulk():
+            self.removed_ids.update(id(block_spot) for block_spot in removed_block_spots)
 
     def handle_event(self, event) -> None:
         if event.type == pygame.QUIT:
             raise self.QuitException
 
+        # Nothing may be edited before the workspace is fully there
+        if self.is_loading:
+            return
+
+        if event.type == pygame.MOUSEWHEEL and self.palette.is_cursor_inside(*self.cursor_location):
+            self.palette.scroll_by(-event.y * constants.PALETTE_SCROLL_STEP)
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == constants.LEFT_MOUSE_BUTTON \
+                and self.minimap.is_cursor_inside(*event.pos):
+            # The clicked point becomes the middle of the screen
+            x, y = self.minimap.to_world(*event.pos)
+            self.pan_view(self.width // 2 - x, self.height // 2 - y)
+            return
+
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == constants.LEFT_MOUSE_BUTTON \
+                and self.tab_bar.is_cursor_inside(*event.pos):
+            tab_index = self.tab_bar.get_tab_at(self.workspaces, *event.pos)
+
+            if tab_index is not None:
+                self.switch_workspace(tab_index)
+            elif self.tab_bar.is_new_tab_button(*event.pos):
+                self.new_workspace()
+            return
+
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == constants.LEFT_MOUSE_BUTTON:
             self.selected_block = self.dragged_block = None
 
-            for block in self.depth_sorted_blocks:
-                if block.is_cursor_inside(*event.pos):
-                    self.selected_block = self.dragged_block = block
-                    break
+            if self.palette.is_cursor_inside(*event.pos):
+                entry = self.palette.get_entry_at(*event.pos)
+
+                if entry:
+                    self.selected_block = self.dragged_block = self.spawn_block(entry.block_type, *entry.rect.topleft)
+
+            else:
+                for block in self.depth_sorted_blocks:
+                    if block.is_cursor_inside(*event.pos):
+                        self.selected_block = self.dragged_block = block
+                        break
 
             if self.selected_block:
                 self.selected_block.update_depth()
+                self.drag_start_location = self.selected_block.topleft
+
+                if self.selected_block.owner is not None:
+                    self.selected_block.owner.extract()
 
-                for block_spot in self.block_spots:
-                    if block_spot.inner == self.selected_block:
-                        block_spot.extract()
+                self.drop_candidates = self.find_drop_candidates(self.dragged_block)
 
         if event.type == pygame.MOUSEBUTTONUP and event.button == constants.LEFT_MOUSE_BUTTON:
+            if self.dragged_block and self.palette.is_cursor_inside(*event.pos):
+                # Dropping a block back onto the palette deletes it
+                self.delete_block(self.dragged_block)
+                self.selected_block = self.dragged_block = None
+
             if self.dragged_block:
-                for block_spot in self.block_spots:
+                if self.dragged_block.topleft != self.drag_start_location:
+                    self.record_edit([journal.OP_MOVE, self.dragged_block.block_id,
+                                      self.dragged_block.x, self.dragged_block.y])
+
+                for block_spot in self.drop_candidates:
                     if block_spot.can_insert(self.dragged_block, *event.pos):
                         block_spot.insert(self.dragged_block)
                         break
 
             self.dragged_block = None
+            self.drop_candidates = []
+
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            self.cursor_location = event.pos
 
         if event.type == pygame.MOUSEMOTION and self.dragged_block:
             self.dragged_block.relative_move(*event.rel)
 
+        if event.type == pygame.KEYDOWN and event.key == constants.DUMP_TRACE_KEY and self.tracer:
+            self.dump_trace()
+            return
+
+        if event.type == pygame.KEYDOWN and event.key == constants.SAVE_CHECKPOINT_KEY and self.checkpoint_path:
+            self.save_checkpoint()
+            return
+
+        if event.type == pygame.KEYDOWN and event.key == constants.TOGGLE_HUD_KEY:
+            self.hud.toggle()
+            return
+
+        if event.type == pygame.KEYDOWN and event.key == constants.TOGGLE_PREVIEWS_KEY:
+            self.show_value_previews = not self.show_value_previews
+            return
+
+        if event.type == pygame.KEYDOWN and getattr(event, 'mod', 0) & pygame.KMOD_CTRL:
+            if event.key == constants.NEW_TAB_KEY:
+                self.new_workspace()
+                return
+
+            if event.key == constants.NEXT_TAB_KEY:
+                step = -1 if event.mod & pygame.KMOD_SHIFT else 1
+                self.switch_workspace((self.active_workspace_index + step) % len(self.workspaces))
+                return
+
+            if event.key == constants.DUPLICATE_KEY and self.selected_block is not None:
+                self.selected_block = self.duplicate_block(self.selected_block,
+                                                           self.selected_block.x + constants.DUPLICATE_OFFSET,
+                                                           self.selected_block.y + constants.DUPLICATE_OFFSET)
+                return
+
         if event.type == pygame.KEYDOWN:
             if self.selected_block:
                 self.selected_block.keyboard_press(event.key)
@@ -386,18 +1278,54 @@ class App:
                 if event.key == pygame.K_SPACE:
                     self.triggered_events.append(constants.TriggeredEvent.SPACE_PRESSED_EVENT)
 
-    def handle_events(self) -> None:
-        for event in pygame.event.get():
+    def find_drop_candidates(self, block: Block) -> List[BlockSpot]:
+        # Computed once when a drag starts, nothing can be inserted or extracted
+        # until the block is dropped, so the list stays valid for the whole drag
+        compatible_spot_types = get_compatible_spot_types(type(block))
+
+        return [block_spot for block_spot in self.block_spots
+                if block_spot.inner is None
+                and type(block_spot) in compatible_spot_types
+                and not block_spot.is_inside(block)]
+
+    def handle_events(self, events: List[pygame.event.Event]) -> None:
+        # Runs of mouse motion events are merged, so a fast drag moves the dragged
+        # subtree once per frame instead of once per event
+        motion_dx = motion_dy = 0
+
+        for event in events:
+            if self.event_recorder:
+                self.event_recorder.record(self.frame_number, event)
+
+            if event.type == pygame.MOUSEMOTION:
+                self.cursor_location = event.pos
+                motion_dx += event.rel[0]
+                motion_dy += event.rel[1]
+                continue
+
+            if self.dragged_block and (motion_dx or motion_dy):
+                self.dragged_block.relative_move(motion_dx, motion_dy)
+            motion_dx = motion_dy = 0
+
             self.handle_event(event)
 
+        if self.dragged_block and (motion_dx or motion_dy):
+            self.dragged_block.relative_move(motion_dx, motion_dy)
+
     def update_blocks(self) -> None:
-        for block in self.blocks:
-            if not block.owner:
+        # Only subtrees whose structure or text changed are laid out again, moved
+        # subtrees are translated as a whole when they move
+        dirty_blocks, self.layout_dirty_blocks = self.layout_dirty_blocks, {}
+
+        for block in dirty_blocks.values():
+            if block.owner is None:
                 block.update_all()
 
     def draw(self, drawable: pygame.Surface, drawable_transparent: pygame.Surface) -> None:
+        self.palette.draw(drawable)
+
         for block in reversed(self.depth_sorted_blocks):
-            if block.owner:
+            if block.owner is not None:
                 continue
 
             block.draw_for_app(drawable,
@@ -405,104 +1333,452 @@ class App:
                                block is self.selected_block,
                                block is self.dragged_block)
 
+        if self.show_value_previews:
+            for block in self.blocks:
+                if isinstance(block, ReturnsValue) and block.has_value_preview():
+                    block.draw_value_preview(drawable)
+
+        for block_spot in self.drop_candidates:
+            block_spot.draw_drop_highlight(drawable, block_spot.collidepoint(self.cursor_location))
+
+        with self.phase_timer.phase('minimap'):
+            self.minimap.draw(drawable)
+
+        self.tab_bar.draw(drawable, self.workspaces, self.active_workspace_index)
+
+        if self.is_loading:
+            text_surface = self.default_in_block_font.render('Loading {:.0%}'.format(self.loading_progress), True,
+                                                             constants.HUD_TEXT_COLOR)
+            drawable.blit(text_surface, text_surface.get_rect(midbottom=(self.width // 2, self.height - 10)))
+
     def register_event_handler(self, event_name: constants.TriggeredEvent, event_handler_brick: 'EventBrick') -> None:
         self.event_handlers[event_name].append(event_handler_brick)
 
+    def register_procedure(self, procedure: 'DefineProcedureBrick') -> None:
+        self.procedure_definitions.append(procedure)
+
+    def find_procedure(self, procedure_name: str) -> 'DefineProcedureBrick':
+        for procedure in self.procedure_definitions:
+            if procedure.get_name() == procedure_name:
+                return procedure
+
+        raise scratch_exceptions.UnknownProcedureException(procedure_name)
+
+    def enter_procedure(self, procedure: 'DefineProcedureBrick', arguments: List[int],
+                        next_bricks: List['Brick']) -> List['Brick']:
+        # `executing_bricks` holds only what is left of the current call, so
+        # after the calling brick it is the continuation of the caller
+        return_bricks = next_bricks + self.executing_bricks
+        self.executing_bricks = []
+
+        variable_scope = VariableScope(self.global_scope)
+        for parameter_name, value in zip(procedure.get_parameter_names(), arguments):
+            if parameter_name is not None:
+                variable_scope.define_variable(parameter_name, value)
+
+        if not return_bricks and self.call_stack:
+            # Tail call, nothing is left to do in the caller so its frame is reused
+            frame = self.call_stack[-1]
+            frame.procedure = procedure
+            frame.variable_scope = variable_scope
+        else:
+            if len(self.call_stack) >= self.recursion_limit:
+                raise scratch_exceptions.RecursionLimitException(self.recursion_limit)
+
+            self.call_stack.append(CallFrame(procedure, variable_scope, return_bricks))
+
+        self.variable_scope = variable_scope
+        return procedure.get_body()
+
+    def leave_procedure(self) -> None:
+        frame = self.call_stack.pop()
+        self.executing_bricks = frame.return_bricks
+        self.variable_scope = self.call_stack[-1].variable_scope if self.call_stack else self.global_scope
+
+    def reset_call_stack(self) -> None:
+        self.call_stack = []
+        self.variable_scope = self.global_scope
+
+    def suspend(self, next_bricks: List['Brick']) -> Continuation:
+        continuation = Continuation(next_bricks + self.executing_bricks, self.call_stack, self.variable_scope)
+
+        self.executing_bricks = []
+        self.call_stack = []
+        self.variable_scope = self.global_scope
+
+        return continuation
+
+    def resume(self, continuation: Continuation) -> None:
+        self.executing_bricks = continuation.bricks
+        self.call_stack = continuation.call_stack
+        self.variable_scope = continuation.variable_scope
+
+    def sleep(self, duration: float, next_bricks: List['Brick']) -> List['Brick']:
+        continuation = self.suspend(next_bricks)
+        heapq.heappush(self.sleeping_continuations,
+                       (time.perf_counter() + duration, next(self.sleep_sequence), continuation))
+
+        return []
+
+    def wake_sleeping(self) -> None:
+        # Only the earliest deadline is looked at while nothing is due
+        now = time.perf_counter()
+
+        while self.sleeping_continuations and self.sleeping_continuations[0][0] <= now:
+            _, _, continuation = heapq.heappop(self.sleeping_continuations)
+            self.ready_continuations.append(continuation)
+
+    def is_executing(self) -> bool:
+        return bool(self.executing_bricks or self.ready_continuations)
+
     def execute_bricks(self) -> None:
+        if not self.executing_bricks and self.ready_continuations:
+            self.resume(self.ready_continuations.popleft())
+
         if self.executing_bricks:
             try:
-                executable = self.executing_bricks[0]
+                executable = self.executing_bricks.pop(0)
+                self.steps_executed += 1
+                if self.tracer:
+                    self.tracer.record_step(executable)
+
                 executable_next = executable.execute()
-                self.executing_bricks = executable_next + self.executing_bricks[1:]
+                self.executing_bricks = executable_next + self.executing_bricks
 
-            except scratch_exceptions.ScratchRuntimeException as e:
+                while not self.executing_bricks and self.call_stack:
+                    self.leave_procedure()
+
+            except (scratch_exceptions.ScratchRuntimeException, ArithmeticError) as e:
                 print('Error', str(e))
+                self.runtime_errors += 1
                 self.executing_bricks = []
+                self.reset_call_stack()
+
+                if self.tracer:
+                    self.dump_trace()
 
     def execute_triggered_events(self) -> None:
-        if self.executing_bricks:
+        if self.is_executing():
             return
 
+        # Every handler is a script of its own, so one of them waiting does not
+        # hold up the others
         for event_name in self.triggered_events:
             for event_brick in self.event_handlers[event_name]:
-                self.executing_bricks.append(event_brick)
+                self.ready_continuations.append(Continuation([event_brick], [], self.global_scope))
 
         self.triggered_events = []
 
-    def spawn_n_times(self, constructor, n, x, y, dx=5, dy=15):
-        for i in range(n):
-            self.blocks.append(constructor(self, x + dx * i, y + dy * i))
+    def step_frame(self, events: List[pygame.event.Event], drawable: pygame.Surface,
+                   drawable_transparent: pygame.Surface) -> None:
+        with self.phase_timer.phase('events'):
+            self.handle_events(events)
 
-    def run(self) -> None:
+        with self.phase_timer.phase('layout'):
+            self.update_blocks()
+
+        with self.phase_timer.phase('execution'):
+            self.wake_sleeping()
+            self.execute_triggered_events()
+            self.execute_bricks()
+
+        with self.phase_timer.phase('drawing'):
+            drawable.fill(constants.BACKGROUND_COLOR)
+            self.draw(drawable, drawable_transparent)
+
+        self.frame_number += 1
+
+    def is_idle(self) -> bool:
+        # Nothing would change on screen until the next input or timer
+        return not (self.layout_dirty_blocks or self.triggered_events or self.is_executing()
+                    or self.dragged_block is not None or self.is_loading or self.minimap.has_pending_work())
+
+    def get_idle_timeout(self) -> float:
+        timeout = constants.IDLE_MAX_WAIT
+
+        if self.sleeping_continuations:
+            timeout = min(timeout, self.sleeping_continuations[0][0] - time.perf_counter())
+
+        return max(timeout, 0.001)
+
+    def wait_while_idle(self) -> List[pygame.event.Event]:
+        # Blocks until an event comes or a timer is due, the event is handed to
+        # the next frame
+        if not self.is_idle():
+            return []
+
+        wait_start = time.perf_counter()
+        event = pygame.event.wait(int(self.get_idle_timeout() * 1000) or 1)
+        self.idle_tracker.add_wait(time.perf_counter() - wait_start)
+
+        if event.type == pygame.NOEVENT:
+            return []
+
+        return [event]
 
-        # for i in range(7):
-        #     self.blocks.append(PressSPACEEventBrick(self, 0, i * 30))
-        #     self.blocks.append(ConditionBrick(self, 100, i * 30))
-        #     self.blocks.append(WhileBrick(self, 200, i * 30))
-        #     self.blocks.append(PrintBrick(self, 300, i * 30))
-        #     self.blocks.append(AssignIntBrick(self, 400, i * 30))
-        #     self.blocks.append(IntPlusIntBlock(self, 500, i * 30))
-        #     self.blocks.append(IntSubIntBlock(self, 600, i * 30))
-        #     self.blocks.append(IntMultiplyIntBlock(self, 700, i * 30))
-        #     self.blocks.append(IntDivIntBlock(self, 800, i * 30))
-        #     self.blocks.append(IntModIntBlock(self, 900, i * 30))
-        #     self.blocks.append(IntGreaterEqualIntBlock(self, 1000, i * 30))
-        #     self.blocks.append(IntLessIntBlock(self, 1100, i * 30))
-        #     self.blocks.append(IntGreaterIntBlock(self, 1200, i * 30))
-
-        # for i in range(48):
-        #    self.blocks.append(NumberBlock(self, i * 20, 200))
-        #    self.blocks.append(VariableNameBlock(self, i * 20, 250))
-
-        self.spawn_n_times(IntPlusIntBlock, 3, 100, 250)
-        self.spawn_n_times(PressSPACEEventBrick, 1, 0, 0)
-        self.spawn_n_times(NumberBlock, 19, 0, 90, 4, 7)
-        self.spawn_n_times(VariableNameBlock, 7, 50, 90)
-        self.spawn_n_times(IntModIntBlock, 1, 100, 90)
-        self.spawn_n_times(IntLessIntBlock, 2, 150, 150)
-        self.spawn_n_times(AssignIntBrick, 7, 200, 210)
-        self.spawn_n_times(IntPlusIntBlock, 2, 100, 250)
-        self.spawn_n_times(PrintBrick, 1, 0, 370)
-        self.spawn_n_times(WhileBrick, 2, 0, 450)
-        self.spawn_n_times(ConditionWithoutElseBrick, 2, 130, 450)
-        self.spawn_n_times(IntEqualIntBlock, 2, 130, 350)
+    async def wait_while_idle_async(self) -> List[pygame.event.Event]:
+        import asyncio
 
+        # Blocking in pygame.event.wait would stall the loader and I/O callbacks,
+        # so the queue is polled instead, which is still far less than a frame
+        if not self.is_idle():
+            return []
+
+        wait_start = time.perf_counter()
+        deadline = wait_start + self.get_idle_timeout()
+        events = []
+
+        while self.is_idle():
+            events = pygame.event.get()
+            remaining = deadline - time.perf_counter()
+
+            if events or remaining <= 0:
+                break
+
+            await asyncio.sleep(min(remaining, constants.IDLE_POLL_INTERVAL))
+
+        self.idle_tracker.add_wait(time.perf_counter() - wait_start)
+        return events
+
+    def get_idle_report(self) -> str:
+        frame_cost, = self.phase_timer.percentiles('frame', (0.5,))
+        return self.idle_tracker.report(time.perf_counter(), self.fps, frame_cost)
+
+    def report_frame_metrics(self, elapsed: float, fps: float) -> None:
+        pygame.display.set_caption('FPS: %d' % fps)
+        self.hud.refresh(self.phase_timer, fps, [self.get_idle_report()])
+
+        if self.frame_metrics_writer:
+            rows = self.frame_metrics_writer.format_rows(elapsed, self.phase_timer)
+            self.run_io(functools.partial(self.frame_metrics_writer.write_rows, rows))
+
+        if self.metrics_server:
+            self.metrics_server.publish(self.collect_metrics(fps))
+
+    def collect_metrics(self, fps: float) -> List['metrics_server.Sample']:
+        now = time.perf_counter()
+        steps_per_second = (self.steps_executed - self.last_metrics_steps) / max(now - self.last_metrics_time, 1e-9)
+        self.last_metrics_time = now
+        self.last_metrics_steps = self.steps_executed
+
+        cache_lookups = self.value_cache_hits + self.value_cache_misses
+
+        samples: List['metrics_server.Sample'] = [
+            ('scratch_interpreter_steps_total', {}, self.steps_executed),
+            ('scratch_interpreter_steps_per_second', {}, round(steps_per_second, 1)),
+            ('scratch_executing_bricks', {}, len(self.executing_bricks)),
+            ('scratch_ready_scripts', {}, len(self.ready_continuations)),
+            ('scratch_sleeping_scripts', {}, len(self.sleeping_continuations)),
+            ('scratch_call_stack_depth', {}, len(self.call_stack)),
+            ('scratch_runtime_errors_total', {}, self.runtime_errors),
+            ('scratch_blocks', {}, len(self.blocks)),
+            ('scratch_block_spots', {}, len(self.block_spots)),
+            ('scratch_value_cache_hits_total', {}, self.value_cache_hits),
+            ('scratch_value_cache_misses_total', {}, self.value_cache_misses),
+            ('scratch_value_cache_hit_ratio', {}, round(self.value_cache_hits / cache_lookups, 4) if cache_lookups else 0),
+            ('scratch_fps', {}, round(fps, 1)),
+            ('scratch_idle_ratio', {}, round(self.idle_tracker.idle_fraction(now), 4)),
+        ]
+
+        for phase_name in self.phase_timer.samples:
+            values = self.phase_timer.percentiles(phase_name, profiling.REPORTED_PERCENTILES)
+
+            for fraction, value in zip(profiling.REPORTED_PERCENTILES, values):
+                samples.append(('scratch_frame_phase_seconds', {'phase': phase_name, 'quantile': str(fraction)},
+                                round(value, 6)))
+
+        return samples
+
+    def open_display(self) -> Tuple[pygame.Surface, pygame.Surface, pygame.Surface]:
         screen = pygame.display.set_mode((self.width, self.height))
         drawable = pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32)
         drawable_transparent = pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32)
+        self.mark_startup('display opened')
+
+        return screen, drawable, drawable_transparent
+
+    def present_frame(self, screen: pygame.Surface, drawable: pygame.Surface) -> None:
+        with self.phase_timer.phase('display'):
+            screen.fill(constants.BACKGROUND_COLOR)
+            screen.blit(drawable, (0, 0))
+            self.hud.draw(screen)
+            pygame.display.update()
+
+    def finish_frame(self, frame_start: float, run_start: float, fps: float) -> None:
+        now = time.perf_counter()
+        self.phase_timer.add_sample('frame', now - frame_start)
+
+        if self.startup_profiler:
+            self.startup_profiler.mark('first frame')
+            print(self.startup_profiler.report())
+            self.startup_profiler = None
+
+        if now - self.last_report_time >= constants.FRAME_METRICS_INTERVAL:
+            self.last_report_time = now
+            self.report_frame_metrics(now - run_start, fps)
+
+    def close(self) -> None:
+        # Inactive workspaces have their journals closed already
+        if self.edit_journal:
+            self.edit_journal.close()
+
+        if self.event_recorder:
+            self.event_recorder.close()
+
+        if self.io_executor:
+            self.io_executor.shutdown(wait=True)
+            self.io_executor = None
+
+        if self.frame_metrics_writer:
+            self.frame_metrics_writer.close()
+
+        if self.metrics_server:
+            self.metrics_server.close()
+
+        pygame.display.quit()
+
+    def run(self) -> None:
+        if self.edit_journal:
+            self.restore_workspace()
+            self.edit_journal.start()
+        self.mark_startup('workspace restored')
+
+        if self.event_recorder:
+            self.event_recorder.start(self.make_snapshot())
+
+        screen, drawable, drawable_transparent = self.open_display()
 
         try:
             clock = pygame.time.Clock()
+            run_start = self.last_report_time = time.perf_counter()
+            self.idle_tracker = profiling.IdleTracker(run_start)
+            woken_by: List[pygame.event.Event] = []
 
             while True:
-                self.handle_events()
-                self.update_blocks()
+                frame_start = time.perf_counter()
+                self.step_frame(woken_by + pygame.event.get(), drawable, drawable_transparent)
+                self.present_frame(screen, drawable)
+                self.finish_frame(frame_start, run_start, clock.get_fps())
+
+                clock.tick(self.fps)
+                woken_by = self.wait_while_idle()
 
-                self.execute_triggered_events()
-                self.execute_bricks()
+        except self.QuitException:
+            pass
 
-                screen.fill(constants.BACKGROUND_COLOR)
-                drawable.fill(constants.BACKGROUND_COLOR)
+        finally:
+            print(self.get_idle_report())
+            self.close()
+
+    async def run_async(self) -> None:
+        # Same frames as run(), but the workspace is read on the I/O thread and
+        # replayed a chunk at a time between frames, and file writes are handed
+        # to that thread too. asyncio is imported only here, it would add to
+        # the startup time of the default loop.
+        import asyncio
+        import concurrent.futures
+
+        self.io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='scratch-io')
+
+        loading = None
+        if self.edit_journal:
+            loading = asyncio.create_task(self.restore_workspace_async())
+        else:
+            self.mark_startup('workspace restored')
 
-                self.draw(drawable, drawable_transparent)
-                screen.blit(drawable, (0, 0))
-                pygame.display.update()
+            if self.event_recorder:
+                self.event_recorder.start(self.make_snapshot())
 
-                clock.tick(self.fps)
-                pygame.display.set_caption('FPS: %d' % clock.get_fps())
+        screen, drawable, drawable_transparent = self.open_display()
+
+        try:
+            clock = pygame.time.Clock()
+            run_start = self.last_report_time = time.perf_counter()
+            self.idle_tracker = profiling.IdleTracker(run_start)
+            woken_by: List[pygame.event.Event] = []
+
+            while True:
+                frame_start = time.perf_counter()
+                self.step_frame(woken_by + pygame.event.get(), drawable, drawable_transparent)
+                self.present_frame(screen, drawable)
+                self.finish_frame(frame_start, run_start, clock.get_fps())
+
+                clock.tick()
+
+                if loading is not None and loading.done():
+                    loading.result()
+                    loading = None
+
+                # Sleeping till the next frame lets the loader and finished I/O run
+                await asyncio.sleep(max(frame_start + 1 / self.fps - time.perf_counter(), 0))
+                woken_by = await self.wait_while_idle_async()
 
         except self.QuitException:
             pass
 
         finally:
-            pygame.display.quit()
+            if loading is not None:
+                loading.cancel()
+
+            print(self.get_idle_report())
+            self.close()
 
 
 class ReturnsValue:
+    value_memo: Optional[ValueMemo] = None
 
     def calculate(self) -> Any:
         raise NotImplementedError
 
+    def calculate_for_preview(self) -> Any:
+        return self.calculate()
+
+    def has_value_preview(self) -> bool:
+        return True
+
+    def calculate_cached(self) -> Any:
+        # Recomputed only if a variable it read was written since, or if the
+        # subtree was edited (App.mark_changed drops the memo then)
+        variable_scope = self.app.variable_scope
+        outer_read_log = variable_scope.read_log
+        memo = self.value_memo
+
+        if memo is not None and memo.is_valid(variable_scope):
+            self.app.value_cache_hits += 1
+        else:
+            self.app.value_cache_misses += 1
+            variable_scope.read_log = {}
+
+            try:
+                memo = ValueMemo(self.calculate_for_preview(), None, variable_scope.read_log)
+            except (scratch_exceptions.ScratchRuntimeException, ArithmeticError) as e:
+                memo = ValueMemo(None, e, variable_scope.read_log)
+            finally:
+                variable_scope.read_log = outer_read_log
+
+            self.value_memo = memo
+
+        if outer_read_log is not None:
+            outer_read_log.update(memo.dependencies)
+
+        if memo.error is not None:
+            raise memo.error
+
+        return memo.value
+
+    def draw_value_preview(self, surface: pygame.Surface) -> None:
+        try:
+            self.calculate_cached()
+        except (scratch_exceptions.ScratchRuntimeException, ArithmeticError):
+            pass
+
+        memo = self.value_memo
+        if memo.label_surface is None:
+            memo.label_surface = self.app.preview_font.render(memo.get_label(), True, constants.PREVIEW_TEXT_COLOR,
+                                                              constants.PREVIEW_BACKGROUND_COLOR)
+
+        surface.blit(memo.label_surface, memo.label_surface.get_rect(bottomright=self.topright))
+
 
 class ReturnsBool(ReturnsValue):
 
@@ -524,77 +1800,94 @@ class ReturnsInt(ReturnsValue):
 
 class OnlyBoolBlockSpot(BlockSpot):
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
-        return isinstance(block, ReturnsBool)
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
+        return issubclass(block_type, ReturnsBool)
 
 
 class OnlyStringBlockSpot(BlockSpot):
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
-        return isinstance(block, ReturnsString)
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
+        return issubclass(block_type, ReturnsString)
 
 
 class OnlyVariableNameBlockSpot(BlockSpot):
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
-        return isinstance(block, VariableNameBlock)
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
+        return issubclass(block_type, VariableNameBlock)
 
 
 class OnlyIntBlockSpot(BlockSpot):
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
-        return isinstance(block, ReturnsInt)
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
+        return issubclass(block_type, ReturnsInt)
 
 
-class NumberBlock(Block, ReturnsInt):
+class TypedTextBlock(Block):
 
     def __init__(self, app: 'App', x: int, y: int):
         super().__init__(app, x, y, 20, 20)
 
         self.text: str = ''
 
+    def recycle(self, x: int, y: int) -> None:
+        super().recycle(x, y)
+        self.text = ''
+
+    def keyboard_press(self, key: int) -> None:
+        # Keys like Shift or arrows, and rejected characters, leave the text as it was
+        text = useful.apply_key(self.text, key)
+        if text == self.text:
+            return
+
+        self.text = text
+        self.app.mark_changed(self)
+        self.app.record_edit([journal.OP_TEXT, self.block_id, self.text])
+
+
+class NumberBlock(TypedTextBlock, ReturnsInt):
+
     def draw(self, surface: pygame.Surface, is_selected: bool) -> None:
         super().draw(surface, is_selected)
 
-        text_surface = self.app.default_in_block_font.render(self.text, True, (0, 0, 0))
+        text_surface = self.app.render_text(self.text, (0, 0, 0))
         surface.blit(text_surface, (self.x + 5, self.y + 5))
 
     def update_size(self) -> None:
-        text_surface = self.app.default_in_block_font.render(self.text, True, (0, 0, 0))
+        text_surface = self.app.render_text(self.text, (0, 0, 0))
         self.width = 10 + text_surface.get_width()
         self.height = 10 + text_surface.get_height()
 
-    def keyboard_press(self, key: int) -> None:
-        self.text = useful.apply_key(self.text, key)
-
     def calculate(self) -> int:
         if useful.represents_integer(self.text):
             return int(self.text)
 
         return self.app.variable_scope.get_variable(self.text)
 
+    def has_value_preview(self) -> bool:
+        # A literal would only repeat its own text
+        return not useful.represents_integer(self.text)
 
-class VariableNameBlock(Block, ReturnsString):
-
-    def __init__(self, app: 'App', x: int, y: int):
-        super().__init__(app, x, y, 20, 20)
 
-        self.text: str = ''
+class VariableNameBlock(TypedTextBlock, ReturnsString):
 
     def draw(self, surface: pygame.Surface, is_selected: bool) -> None:
         super().draw(surface, is_selected)
         pygame.draw.rect(surface, (90, 200, 90), (self.x, self.y, self.width, self.height), 1)
 
-        text_surface = self.app.default_in_block_font.render(self.text, True, (0, 0, 0))
+        text_surface = self.app.render_text(self.text, (0, 0, 0))
         surface.blit(text_surface, (self.x + 5, self.y + 5))
 
     def update_size(self) -> None:
-        text_surface = self.app.default_in_block_font.render(self.text, True, (0, 0, 0))
+        text_surface = self.app.render_text(self.text, (0, 0, 0))
         self.width = 10 + text_surface.get_width()
         self.height = 10 + text_surface.get_height()
 
-    def keyboard_press(self, key: int) -> None:
-        self.text = useful.apply_key(self.text, key)
+    def has_value_preview(self) -> bool:
+        return False
 
     def calculate(self) -> str:
         if useful.represents_variable_name(self.text):
@@ -623,11 +1916,17 @@ class BinaryIntOperation(GridBlock, ReturnsInt):
         self.op_function = op_function
 
     def calculate(self) -> int:
-        if self.left_spot.inner and self.right_spot.inner:
+        if self.left_spot.inner is not None and self.right_spot.inner is not None:
             return self.op_function(self.left_spot.inner.calculate(), self.right_spot.inner.calculate())
 
         raise scratch_exceptions.EmptyArgumentException
 
+    def calculate_for_preview(self) -> int:
+        if self.left_spot.inner is not None and self.right_spot.inner is not None:
+            return self.op_function(self.left_spot.inner.calculate_cached(), self.right_spot.inner.calculate_cached())
+
+        raise scratch_exceptions.EmptyArgumentException
+
 
 class IntPlusIntBlock(BinaryIntOperation):
 
@@ -679,11 +1978,17 @@ class IntCompareOperation(GridBlock, ReturnsBool):
         self.op_function = op_function
 
     def calculate(self) -> bool:
-        if self.left_spot.inner and self.right_spot.inner:
+        if self.left_spot.inner is not None and self.right_spot.inner is not None:
             return self.op_function(self.left_spot.inner.calculate(), self.right_spot.inner.calculate())
 
         raise scratch_exceptions.EmptyArgumentException
 
+    def calculate_for_preview(self) -> bool:
+        if self.left_spot.inner is not None and self.right_spot.inner is not None:
+            return self.op_function(self.left_spot.inner.calculate_cached(), self.right_spot.inner.calculate_cached())
+
+        raise scratch_exceptions.EmptyArgumentException
+
 
 class IntGreaterIntBlock(IntCompareOperation):
 
@@ -732,8 +2037,9 @@ class Brick(Block):
 
 class OnlyBrickSpot(BlockSpot):
 
-    def check_other_insert_conditions(self, block: Block) -> bool:
-        return isinstance(block, Brick) and not isinstance(block, EventBrick)
+    @classmethod
+    def accepts_block_type(cls, block_type: Type[Block]) -> bool:
+        return issubclass(block_type, Brick) and not issubclass(block_type, (EventBrick, DefineProcedureBrick))
 
 
 class EventBrick(Brick):
@@ -742,14 +2048,26 @@ class EventBrick(Brick):
                  event_name: constants.TriggeredEvent, displayed_event_name: str):
         super().__init__(app, x, y, width, height)
 
+        self.event_name: constants.TriggeredEvent = event_name
         app.register_event_handler(event_name, self)
 
         self.next_spot = OnlyBrickSpot(app, self, 0, 0,
                                        constants.EMPTY_BRICK_SLOT_WIDTH, constants.EMPTY_BRICK_SLOT_HEIGHT)
-        self.text_surface = self.app.default_in_block_font.render(displayed_event_name, True, (0, 0, 0))
+        self.text_surface = self.app.render_text(displayed_event_name, (0, 0, 0))
 
-    def is_recursive_contain_block_spot(self, block_spot: 'BlockSpot'):
-        return self.next_spot.is_recursive_contain_block_spot(block_spot)
+    def child_rects(self) -> List[UpdatableRect]:
+        return [self.next_spot]
+
+    def child_spots(self) -> List['BlockSpot']:
+        return [self.next_spot]
+
+    def register(self) -> None:
+        super().register()
+        self.app.register_event_handler(self.event_name, self)
+
+    def unregister(self) -> None:
+        super().unregister()
+        useful.remove_by_identity(self.app.event_handlers[self.event_name], self)
 
     def calculate_full_content_rect(self) -> None:
         self.full_content_rect = ExpandingRect(self.x, self.y, self.width, self.height)\
@@ -771,7 +2089,7 @@ class EventBrick(Brick):
         surface.blit(self.text_surface, location)
 
     def update_size(self) -> None:
-        self.next_spot.update_size()
+        self.next_spot.update_all()
 
         self.width = self.text_surface.get_width() + 20
         self.height = self.text_surface.get_height() + 10
@@ -779,7 +2097,7 @@ class EventBrick(Brick):
         self.next_spot.update_location(self.x, self.bottom)
 
     def execute(self) -> List['Brick']:
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             return [self.next_spot.inner]
 
         return []
@@ -823,9 +2141,17 @@ class GridBrick(GridBlock, Brick):
             self.next_spot.update_location(self.x, self.bottom)
             self.next_spot.update_all()
 
-    def is_recursive_contain_block_spot(self, block_spot: 'BlockSpot') -> bool:
-        return super().is_recursive_contain_block_spot(block_spot) \
-               or self.next_spot.is_recursive_contain_block_spot(block_spot)
+    def child_rects(self) -> List[UpdatableRect]:
+        if self.next_spot:
+            return super().child_rects() + [self.next_spot]
+
+        return super().child_rects()
+
+    def child_spots(self) -> List['BlockSpot']:
+        if self.next_spot:
+            return super().child_spots() + [self.next_spot]
+
+        return super().child_spots()
 
     def execute(self) -> List['Brick']:
         raise NotImplementedError
@@ -844,14 +2170,14 @@ class PrintBrick(GridBrick):
                            'column'  : 1}])
 
     def execute(self) -> List['Brick']:
-        if self.spot.inner:
+        if self.spot.inner is not None:
             result = self.spot.inner.calculate()
             print('PRINT: {}'.format(result))
 
         else:
             raise scratch_exceptions.EmptyArgumentException
 
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             return [self.next_spot.inner]
 
         return []
@@ -884,25 +2210,28 @@ class ConditionBrick(GridBrick):
                            'column'  : 1}])
 
     def execute(self) -> List['Brick']:
-        if not self.condition_spot.inner:
+        if self.condition_spot.inner is None:
             raise scratch_exceptions.EmptyArgumentException
 
         condition_result: bool = self.condition_spot.inner.calculate()
+        if self.app.tracer:
+            self.app.tracer.record_branch(self, condition_result)
+
         next_bricks = []
 
         if condition_result:
-            if self.true_spot.inner:
+            if self.true_spot.inner is not None:
                 next_bricks.append(self.true_spot.inner)
             else:
                 raise scratch_exceptions.EmptyArgumentException
 
         else:
-            if self.false_spot.inner:
+            if self.false_spot.inner is not None:
                 next_bricks.append(self.false_spot.inner)
             else:
                 raise scratch_exceptions.EmptyArgumentException
 
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             next_bricks.append(self.next_spot.inner)
 
         return next_bricks
@@ -928,19 +2257,22 @@ class ConditionWithoutElseBrick(GridBrick):
                            'column'  : 1}])
 
     def execute(self) -> List['Brick']:
-        if not self.condition_spot.inner:
+        if self.condition_spot.inner is None:
             raise scratch_exceptions.EmptyArgumentException
 
         condition_result: bool = self.condition_spot.inner.calculate()
+        if self.app.tracer:
+            self.app.tracer.record_branch(self, condition_result)
+
         next_bricks = []
 
         if condition_result:
-            if self.true_spot.inner:
+            if self.true_spot.inner is not None:
                 next_bricks.append(self.true_spot.inner)
             else:
                 raise scratch_exceptions.EmptyArgumentException
 
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             next_bricks.append(self.next_spot.inner)
 
         return next_bricks
@@ -964,18 +2296,20 @@ class WhileBrick(GridBrick):
                            'columnspan': 2}])
 
     def execute(self) -> List['Brick']:
-        if not self.condition_spot.inner:
+        if self.condition_spot.inner is None:
             raise scratch_exceptions.EmptyArgumentException
 
         condition_result: bool = self.condition_spot.inner.calculate()
+        if self.app.tracer:
+            self.app.tracer.record_branch(self, condition_result)
 
         if condition_result:
-            if self.true_spot.inner:
+            if self.true_spot.inner is not None:
                 return [self.true_spot.inner, self]
             else:
                 raise scratch_exceptions.EmptyArgumentException
 
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             return [self.next_spot.inner]
 
         return []
@@ -993,19 +2327,197 @@ class AssignIntBrick(GridBrick):
                            'name': 'int_spot', 'row': 0, 'column': 2}])
 
     def execute(self) -> List['Brick']:
-        if self.variable_spot.inner:
+        if self.variable_spot.inner is not None:
             var_name = self.variable_spot.inner.calculate()
         else:
             raise scratch_exceptions.EmptyArgumentException
 
-        if self.int_spot.inner:
+        if self.int_spot.inner is not None:
             value = self.int_spot.inner.calculate()
         else:
             raise scratch_exceptions.EmptyArgumentException
 
         self.app.variable_scope.set_variable(var_name, value)
+        if self.app.tracer:
+            self.app.tracer.record_write(self, var_name, value)
 
-        if self.next_spot.inner:
+        if self.next_spot.inner is not None:
             return [self.next_spot.inner]
 
         return []
+
+
+class DefineProcedureBrick(GridBrick):
+
+    def __init__(self, app: 'App', x: int, y: int):
+        content = [{'instance': TextBlock(app, 0, 0, 'define'),
+                    'row'     : 0,
+                    'column'  : 0},
+                   {'instance': OnlyVariableNameBlockSpot(app, self, 0, 0, 40, 20),
+                    'name'    : 'name_spot',
+                    'row'     : 0,
+                    'column'  : 1}]
+
+        for i in range(constants.PROCEDURE_PARAMETER_COUNT):
+            content.append({'instance': OnlyVariableNameBlockSpot(app, self, 0, 0, 40, 20),
+                            'name'    : 'parameter_spot_{}'.format(i),
+                            'row'     : 0,
+                            'column'  : 2 + i})
+
+        content.append({'instance'  : OnlyBrickSpot(app, self, 0, 0, 40, 20),
+                        'name'      : 'body_spot',
+                        'row'       : 1,
+                        'column'    : 0,
+                        'columnspan': 2 + constants.PROCEDURE_PARAMETER_COUNT})
+
+        super().__init__(app, x, y, content, have_next=False)
+        app.register_procedure(self)
+
+    def register(self) -> None:
+        super().register()
+        self.app.register_procedure(self)
+
+    def unregister(self) -> None:
+        super().unregister()
+        useful.remove_by_identity(self.app.procedure_definitions, self)
+
+    def get_name(self) -> Optional[str]:
+        if self.name_spot.inner is None:
+            return None
+
+        return self.name_spot.inner.text
+
+    def get_parameter_names(self) -> List[Optional[str]]:
+        # Empty parameter spots leave their argument unused
+        parameter_names = []
+
+        for i in range(constants.PROCEDURE_PARAMETER_COUNT):
+            inner = getattr(self, 'parameter_spot_{}'.format(i)).inner
+            parameter_names.append(inner.calculate() if inner is not None else None)
+
+        return parameter_names
+
+    def get_body(self) -> List['Brick']:
+        if self.body_spot.inner is not None:
+            return [self.body_spot.inner]
+
+        return []
+
+    def execute(self) -> List['Brick']:
+        return self.get_body()
+
+
+class CallProcedureBrick(GridBrick):
+
+    def __init__(self, app: 'App', x: int, y: int):
+        content = [{'instance': TextBlock(app, 0, 0, 'call'),
+                    'row'     : 0,
+                    'column'  : 0},
+                   {'instance': OnlyVariableNameBlockSpot(app, self, 0, 0, 40, 20),
+                    'name'    : 'name_spot',
+                    'row'     : 0,
+                    'column'  : 1}]
+
+        for i in range(constants.PROCEDURE_PARAMETER_COUNT):
+            content.append({'instance': OnlyIntBlockSpot(app, self, 0, 0, 40, 20),
+                            'name'    : 'argument_spot_{}'.format(i),
+                            'row'     : 0,
+                            'column'  : 2 + i})
+
+        super().__init__(app, x, y, content)
+
+    def execute(self) -> List['Brick']:
+        if self.name_spot.inner is None:
+            raise scratch_exceptions.EmptyArgumentException
+
+        procedure = self.app.find_procedure(self.name_spot.inner.calculate())
+
+        # Only the arguments the procedure has a parameter for are required
+        arguments = []
+        for i, parameter_name in enumerate(procedure.get_parameter_names()):
+            inner = getattr(self, 'argument_spot_{}'.format(i)).inner
+
+            if parameter_name is None:
+                arguments.append(None)
+            elif inner is None:
+                raise scratch_exceptions.EmptyArgumentException
+            else:
+                arguments.append(inner.calculate())
+
+        next_bricks = []
+        if self.next_spot.inner is not None:
+            next_bricks.append(self.next_spot.inner)
+
+        return self.app.enter_procedure(procedure, arguments, next_bricks)
+
+
+class WaitBrick(GridBrick):
+
+    def __init__(self, app: 'App', x: int, y: int):
+        super().__init__(app, x, y,
+                         [{'instance': TextBlock(app, 0, 0, 'wait'),
+                           'row'     : 0,
+                           'column'  : 0},
+                          {'instance': OnlyIntBlockSpot(app, self, 0, 0, 40, 20),
+                           'name'    : 'duration_spot',
+                           'row'     : 0,
+                           'column'  : 1},
+                          {'instance': TextBlock(app, 0, 0, 'ms'),
+                           'row'     : 0,
+                           'column'  : 2}])
+
+    def execute(self) -> List['Brick']:
+        if self.duration_spot.inner is None:
+            raise scratch_exceptions.EmptyArgumentException
+
+        duration = max(self.duration_spot.inner.calculate(), 0)
+
+        next_bricks = []
+        if self.next_spot.inner is not None:
+            next_bricks.append(self.next_spot.inner)
+
+        return self.app.sleep(duration / 1000, next_bricks)
+
+
+class EveryBrick(GridBrick):
+    # Runs its body once every interval, forever, so nothing can follow it
+
+    def __init__(self, app: 'App', x: int, y: int):
+        super().__init__(app, x, y,
+                         [{'instance': TextBlock(app, 0, 0, 'every'),
+                           'row'     : 0,
+                           'column'  : 0},
+                          {'instance': OnlyIntBlockSpot(app, self, 0, 0, 40, 20),
+                           'name'    : 'interval_spot',
+                           'row'     : 0,
+                           'column'  : 1},
+                          {'instance': TextBlock(app, 0, 0, 'ms'),
+                           'row'     : 0,
+                           'column'  : 2},
+                          {'instance'  : OnlyBrickSpot(app, self, 0, 0, 40, 20),
+                           'name'      : 'true_spot',
+                           'row'       : 1,
+                           'column'    : 0,
+                           'columnspan': 3}],
+                         have_next=False)
+
+    def execute(self) -> List['Brick']:
+        if self.interval_spot.inner is None or self.true_spot.inner is None:
+            raise scratch_exceptions.EmptyArgumentException
+
+        # At least a millisecond, with no interval the body would never yield to other scripts
+        interval = max(self.interval_spot.inner.calculate(), 1)
+
+        return self.app.sleep(interval / 1000, [self.true_spot.inner, self])
+
+
+PALETTE_BLOCK_TYPES: List[Type[Block]] = [
+    PressSPACEEventBrick, AssignIntBrick, PrintBrick, ConditionWithoutElseBrick, ConditionBrick, WhileBrick,
+    DefineProcedureBrick, CallProcedureBrick, WaitBrick, EveryBrick,
+    NumberBlock, VariableNameBlock,
+    IntPlusIntBlock, IntSubIntBlock, IntMultiplyIntBlock, IntDivIntBlock, IntModIntBlock,
+    IntLessIntBlock, IntGreaterIntBlock, IntEqualIntBlock, IntLessEqualIntBlock, IntGreaterEqualIntBlock,
+    IntNotEqualIntBlock,
+]
+
+BLOCK_TYPES: Dict[str, Type[Block]] = {block_type.__name__: block_type for block_type in PALETTE_BLOCK_TYPES}
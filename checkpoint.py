@@ -0,0 +1,91 @@
+from typing import *
+
+import gzip
+import json
+import os
+import signal
+import time
+
+CHECKPOINT_FORMAT = 1
+
+
+def encode_checkpoint(checkpoint: Dict[str, Any]) -> bytes:
+    data = json.dumps(dict(checkpoint, format=CHECKPOINT_FORMAT), separators=(',', ':')).encode('utf-8')
+    return gzip.compress(data)
+
+
+def decode_checkpoint(data: bytes) -> Dict[str, Any]:
+    checkpoint = json.loads(gzip.decompress(data).decode('utf-8'))
+
+    if checkpoint.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError('written by an incompatible version')
+
+    check_block_ids(checkpoint)
+    return checkpoint
+
+
+def check_block_ids(checkpoint: Dict[str, Any]) -> None:
+    # Every brick a script refers to has to be one of the saved blocks
+    block_ids = {entry[0] for entry in checkpoint['workspace']['blocks']}
+    continuations = [checkpoint['running'], *checkpoint['ready'],
+                     *(encoded for _, encoded in checkpoint['sleeping'])]
+
+    for encoded in continuations:
+        used_ids = list(encoded['bricks'])
+        for procedure_id, _, return_ids in encoded['call_stack']:
+            used_ids.append(procedure_id)
+            used_ids.extend(return_ids)
+
+        for block_id in used_ids:
+            if block_id not in block_ids:
+                raise ValueError('a script refers to the unknown block {}'.format(block_id))
+
+
+def write_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    with open(path + '.tmp', 'wb') as file:
+        file.write(encode_checkpoint(checkpoint))
+    os.replace(path + '.tmp', path)
+
+
+def read_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'rb') as file:
+            return decode_checkpoint(file.read())
+    except (OSError, ValueError) as e:
+        raise ValueError('{} is not a checkpoint: {}'.format(path, e))
+
+
+def run_to_completion(app, checkpoint_path: Optional[str], checkpoint_every: float) -> bool:
+    # Runs every script until none is left, checkpointing every
+    # `checkpoint_every` seconds. Ctrl+C stops between two steps, never inside
+    # one, and writes a last checkpoint; False is returned then.
+    stop_requested = []
+    previous_handler = signal.signal(signal.SIGINT, lambda *_: stop_requested.append(True))
+    last_checkpoint = time.perf_counter()
+
+    try:
+        while app.is_executing() or app.sleeping_continuations or app.triggered_events:
+            if stop_requested:
+                if checkpoint_path:
+                    write_checkpoint(checkpoint_path, app.make_checkpoint())
+                return False
+
+            app.wake_sleeping()
+            app.execute_triggered_events()
+
+            if app.is_executing():
+                app.execute_bricks()
+            else:
+                time.sleep(app.get_idle_timeout())
+
+            now = time.perf_counter()
+            if checkpoint_path and now - last_checkpoint >= checkpoint_every:
+                write_checkpoint(checkpoint_path, app.make_checkpoint())
+                last_checkpoint = now
+
+        return True
+
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
@@ -1,4 +1,5 @@
 import enum
+import pygame
 
 EMPTY_BRICK_SLOT_WIDTH = 50
 EMPTY_BRICK_SLOT_HEIGHT = 20
@@ -8,8 +9,68 @@ EMPTY_BLOCK_SPOT_HEIGHT = 20
 
 LEFT_MOUSE_BUTTON = 1
 
+DUMP_TRACE_KEY = pygame.K_F9
+TOGGLE_HUD_KEY = pygame.K_F3
+TOGGLE_PREVIEWS_KEY = pygame.K_F4
+SAVE_CHECKPOINT_KEY = pygame.K_F6
+# Both with Ctrl, Shift goes to the previous tab
+NEW_TAB_KEY = pygame.K_t
+NEXT_TAB_KEY = pygame.K_TAB
+# With Ctrl, copies the selected block and everything inside it
+DUPLICATE_KEY = pygame.K_d
+DUPLICATE_OFFSET = 20
+
 BACKGROUND_COLOR = (0, 0, 0)
+DROP_TARGET_COLOR = (255, 255, 0)
 
 
 class TriggeredEvent(enum.Enum):
     SPACE_PRESSED_EVENT = 1
+
+PROCEDURE_PARAMETER_COUNT = 2
+RECURSION_LIMIT = 1000
+
+DEFAULT_FONT_NAME = 'Consolas'
+DEFAULT_FONT_SIZE = 16
+TEXT_SURFACE_CACHE_SIZE = 4096
+
+FONT_CACHE_FILE_NAME = 'fonts.json'
+
+JOURNAL_FILE_NAME = 'journal.jsonl'
+SNAPSHOT_FILE_NAME = 'snapshot.json'
+JOURNAL_COMPACT_EVERY = 1000
+LOAD_CHUNK_SIZE = 500
+
+CHECKPOINT_FILE_NAME = 'checkpoint.json.gz'
+CHECKPOINT_EVERY = 60
+
+PALETTE_WIDTH = 180
+PALETTE_MARGIN = 10
+PALETTE_SCROLL_STEP = 40
+PALETTE_BACKGROUND_COLOR = (40, 40, 40)
+
+MINIMAP_WIDTH = 200
+MINIMAP_HEIGHT = 120
+MINIMAP_MARGIN = 10
+MINIMAP_CELL_SIZE = 20
+MINIMAP_BLOCKS_PER_FRAME = 200
+MINIMAP_BACKGROUND_COLOR = (25, 25, 25)
+MINIMAP_BORDER_COLOR = (120, 120, 120)
+MINIMAP_VIEW_COLOR = (255, 255, 255)
+
+TAB_BAR_HEIGHT = 24
+TAB_MARGIN = 6
+ACTIVE_TAB_COLOR = (90, 90, 90)
+INACTIVE_TAB_COLOR = (55, 55, 55)
+
+FRAME_TIMER_WINDOW = 600
+FRAME_METRICS_INTERVAL = 0.5
+# Idle waits end at least this often, so the HUD and metrics keep updating
+IDLE_MAX_WAIT = FRAME_METRICS_INTERVAL
+IDLE_POLL_INTERVAL = 0.01
+HUD_TEXT_COLOR = (230, 230, 230)
+HUD_BACKGROUND_COLOR = (0, 0, 0, 190)
+
+PREVIEW_FONT_SIZE = 12
+PREVIEW_TEXT_COLOR = (255, 255, 255)
+PREVIEW_BACKGROUND_COLOR = (60, 60, 60)
@@ -0,0 +1,226 @@
+from typing import *
+
+import contextlib
+import io
+import bricks
+import constants
+import useful
+
+MODULE_HEADER = '''# Generated from a Scratch workspace
+
+
+class ScratchRuntimeError(Exception):
+    pass
+
+
+def fail(message):
+    raise ScratchRuntimeError(message)
+'''
+
+MODULE_FOOTER = '''
+
+def main():
+{calls}
+
+
+if __name__ == '__main__':
+    main()
+'''
+
+INDENT = '    '
+
+
+class PythonExporter:
+    # Every event handler becomes one function, Scratch variables become its
+    # local variables. Anything the exporter does not know is reported in
+    # `unsupported` and turns into a runtime failure at the same place.
+
+    def __init__(self, app: bricks.App):
+        self.app: bricks.App = app
+        self.lines: List[str] = []
+        self.unsupported: List[str] = []
+
+    @staticmethod
+    def variable_identifier(var_name: str) -> str:
+        # '-' is the only character which can be typed but is not allowed in identifiers
+        return 'var_' + var_name.replace('-', '_')
+
+    @staticmethod
+    def handler_name(event_name: constants.TriggeredEvent) -> str:
+        return 'on_' + event_name.name.lower()
+
+    def emit(self, depth: int, line: str) -> None:
+        self.lines.append(INDENT * depth + line)
+
+    def report_unsupported(self, block: bricks.Block) -> str:
+        description = '{} (block {})'.format(type(block).__name__, block.block_id)
+        self.unsupported.append(description)
+
+        return "fail('Unsupported {}')".format(type(block).__name__)
+
+    def export_expression(self, block_spot: bricks.BlockSpot) -> str:
+        block = block_spot.inner
+
+        if block is None:
+            return "fail('Empty argument')"
+
+        if isinstance(block, bricks.NumberBlock):
+            if useful.represents_integer(block.text):
+                return str(int(block.text))
+
+            if useful.represents_variable_name(block.text):
+                return self.variable_identifier(block.text)
+
+            return 'fail({!r})'.format('Invalid variable {}'.format(block.text))
+
+        if isinstance(block, (bricks.BinaryIntOperation, bricks.IntCompareOperation)):
+            operator = self.get_operator(block)
+            if operator is None:
+                return self.report_unsupported(block)
+
+            return '({} {} {})'.format(self.export_expression(block.left_spot), operator,
+                                       self.export_expression(block.right_spot))
+
+        return self.report_unsupported(block)
+
+    @staticmethod
+    def get_operator(block: bricks.Block) -> Optional[str]:
+        return {bricks.IntPlusIntBlock        : '+',
+                bricks.IntSubIntBlock         : '-',
+                bricks.IntMultiplyIntBlock    : '*',
+                bricks.IntDivIntBlock         : '//',
+                bricks.IntModIntBlock         : '%',
+                bricks.IntGreaterIntBlock     : '>',
+                bricks.IntLessIntBlock        : '<',
+                bricks.IntEqualIntBlock       : '==',
+                bricks.IntGreaterEqualIntBlock: '>=',
+                bricks.IntLessEqualIntBlock   : '<=',
+                bricks.IntNotEqualIntBlock    : '!='}.get(type(block))
+
+    def export_chain(self, first_spot: Optional[bricks.BlockSpot], depth: int) -> None:
+        lines_before = len(self.lines)
+        block_spot = first_spot
+
+        while block_spot is not None and block_spot.inner is not None:
+            brick = block_spot.inner
+            self.export_brick(brick, depth)
+            block_spot = getattr(brick, 'next_spot', None)
+
+        if len(self.lines) == lines_before:
+            self.emit(depth, 'pass')
+
+    def export_branch(self, block_spot: bricks.BlockSpot, depth: int) -> None:
+        if block_spot.inner is None:
+            self.emit(depth, "fail('Empty argument')")
+        else:
+            self.export_chain(block_spot, depth)
+
+    def export_brick(self, brick: bricks.Block, depth: int) -> None:
+        if isinstance(brick, bricks.AssignIntBrick):
+            var_block = brick.variable_spot.inner
+
+            if var_block is None:
+                self.emit(depth, "fail('Empty argument')")
+            elif not useful.represents_variable_name(var_block.text):
+                self.emit(depth, 'fail({!r})'.format('Invalid variable {}'.format(var_block.text)))
+            else:
+                self.emit(depth, '{} = {}'.format(self.variable_identifier(var_block.text),
+                                                  self.export_expression(brick.int_spot)))
+
+        elif isinstance(brick, bricks.PrintBrick):
+            self.emit(depth, "print('PRINT: {{}}'.format({}))".format(self.export_expression(brick.spot)))
+
+        elif isinstance(brick, bricks.ConditionBrick):
+            self.emit(depth, 'if {}:'.format(self.export_expression(brick.condition_spot)))
+            self.export_branch(brick.true_spot, depth + 1)
+            self.emit(depth, 'else:')
+            self.export_branch(brick.false_spot, depth + 1)
+
+        elif isinstance(brick, bricks.ConditionWithoutElseBrick):
+            self.emit(depth, 'if {}:'.format(self.export_expression(brick.condition_spot)))
+            self.export_branch(brick.true_spot, depth + 1)
+
+        elif isinstance(brick, bricks.WhileBrick):
+            self.emit(depth, 'while {}:'.format(self.export_expression(brick.condition_spot)))
+            self.export_branch(brick.true_spot, depth + 1)
+
+        else:
+            self.emit(depth, self.report_unsupported(brick))
+
+    def export(self) -> str:
+        self.lines = [MODULE_HEADER]
+        self.unsupported = []
+        calls = []
+
+        for event_name in constants.TriggeredEvent:
+            event_bricks = self.app.event_handlers.get(event_name, [])
+            if not event_bricks:
+                continue
+
+            self.emit(0, '')
+            self.emit(0, 'def {}():'.format(self.handler_name(event_name)))
+
+            # Handlers are separate scripts, an error stops only the one it happened in
+            for event_brick in event_bricks:
+                self.emit(1, '# {} (block {})'.format(type(event_brick).__name__, event_brick.block_id))
+                self.emit(1, 'try:')
+                self.export_chain(event_brick.next_spot, 2)
+                self.emit(1, 'except (ScratchRuntimeError, NameError, ArithmeticError) as e:')
+                self.emit(2, "print('Error', e)")
+
+            calls.append(INDENT + '{}()'.format(self.handler_name(event_name)))
+
+        self.lines.append(MODULE_FOOTER.format(calls='\n'.join(calls) or INDENT + 'pass'))
+
+        return '\n'.join(self.lines)
+
+
+def run_exported(code: str) -> List[str]:
+    output = io.StringIO()
+    namespace = {'__name__': 'exported'}
+
+    with contextlib.redirect_stdout(output):
+        exec(compile(code, 'exported', 'exec'), namespace)
+        namespace['main']()
+
+    return output.getvalue().splitlines()
+
+
+def run_interpreted(app: bricks.App, max_steps: int) -> Optional[List[str]]:
+    clone = bricks.App(app.width, app.height, app.fps)
+    clone.load_workspace(app.make_snapshot(), [])
+    clone.update_blocks()
+
+    output = io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        for event_name in constants.TriggeredEvent:
+            clone.triggered_events.append(event_name)
+        clone.execute_triggered_events()
+
+        for _ in range(max_steps):
+            if not clone.is_executing():
+                break
+            clone.execute_bricks()
+        else:
+            return None
+
+    # Scripts still waiting on a timer would print more later, the exported
+    # module has no timers to compare that with
+    if clone.sleeping_continuations:
+        return None
+
+    return output.getvalue().splitlines()
+
+
+def normalize_output(lines: List[str]) -> List[str]:
+    # Error messages are worded differently, only whether the run failed is compared
+    return [line if line.startswith('PRINT: ') else 'Error' for line in lines]
+
+
+def compare_with_interpreter(app: bricks.App, code: str, max_steps: int = 1000000) -> Optional[bool]:
+    interpreted = run_interpreted(app, max_steps)
+    if interpreted is None:
+        return None
+
+    return normalize_output(run_exported(code)) == normalize_output(interpreted)
@@ -0,0 +1,61 @@
+from typing import *
+
+import json
+import os
+import constants
+import useful
+import pygame
+
+
+def get_cache_path() -> str:
+    return os.path.join(useful.user_cache_dir(), constants.FONT_CACHE_FILE_NAME)
+
+
+def load_cached_font_paths() -> Dict[str, str]:
+    try:
+        with open(get_cache_path(), encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(data, dict) or data.get('pygame') != pygame.version.ver:
+        return {}
+
+    return data.get('fonts', {})
+
+
+def save_cached_font_paths(font_paths: Dict[str, str]) -> None:
+    path = get_cache_path()
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'pygame': pygame.version.ver, 'fonts': font_paths}, file)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+
+def find_font_path(font_name: str) -> Optional[str]:
+    # An empty string is a remembered miss, so that a font which is not installed
+    # does not trigger a full system font scan on every launch
+    font_paths = load_cached_font_paths()
+
+    if font_name in font_paths:
+        path = font_paths[font_name]
+
+        if not path:
+            return None
+
+        if os.path.isfile(path):
+            return path
+
+    path = pygame.font.match_font(font_name)
+    font_paths[font_name] = path or ''
+    save_cached_font_paths(font_paths)
+
+    return path
+
+
+def load_font(font_name: str, size: int) -> pygame.font.Font:
+    return pygame.font.Font(find_font_path(font_name), size)
@@ -0,0 +1,42 @@
+from typing import *
+
+import constants
+import profiling
+import pygame
+
+
+class FrameHud:
+    # The overlay text is rendered again only a few times per second, not on
+    # every frame it is shown
+
+    def __init__(self, font: pygame.font.Font):
+        self.font: pygame.font.Font = font
+        self.visible: bool = False
+        self.surface: Optional[pygame.Surface] = None
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+
+    def refresh(self, phase_timer: profiling.PhaseTimer, fps: float, status_lines: Sequence[str] = ()) -> None:
+        if not self.visible:
+            return
+
+        lines = ['FPS {:.0f}'.format(fps), *status_lines, '{:<10} {:>6} {:>6} {:>6}'.format('ms', 'p50', 'p95', 'p99')]
+
+        for phase_name in phase_timer.samples:
+            lines.append('{:<10} {:>6.2f} {:>6.2f} {:>6.2f}'.format(
+                phase_name, *(value * 1000 for value in phase_timer.percentiles(phase_name, profiling.REPORTED_PERCENTILES))))
+
+        rendered = [self.font.render(line, True, constants.HUD_TEXT_COLOR) for line in lines]
+        line_height = self.font.get_linesize()
+
+        self.surface = pygame.Surface((max(line.get_width() for line in rendered) + 10,
+                                       line_height * len(rendered) + 10), pygame.SRCALPHA, 32)
+        self.surface.fill(constants.HUD_BACKGROUND_COLOR)
+
+        for i, line in enumerate(rendered):
+            self.surface.blit(line, (5, 5 + i * line_height))
+
+    def draw(self, surface: pygame.Surface) -> None:
+        if self.visible and self.surface:
+            surface.blit(self.surface, self.surface.get_rect(topright=(surface.get_width() - 5, 5)))
@@ -0,0 +1,140 @@
+from typing import *
+
+import json
+import os
+import queue
+import threading
+import constants
+
+OP_SPAWN = 's'
+OP_MOVE = 'm'
+OP_INSERT = 'i'
+OP_EXTRACT = 'e'
+OP_TEXT = 't'
+OP_DELETE = 'd'
+OP_PAN = 'p'
+OP_DUPLICATE = 'c'
+
+
+def write_json_atomically(path: str, data: Any) -> None:
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(data, file, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+class EditJournal:
+    # Every structural edit is appended as one short JSON line by a background
+    # writer. Every `compact_every` records the whole workspace is written as a
+    # snapshot and the journal starts over, the generation number tells which
+    # journal belongs to which snapshot if the process dies in between.
+
+    def __init__(self, directory: str, compact_every: int = constants.JOURNAL_COMPACT_EVERY):
+        self.directory: str = directory
+        self.journal_path: str = os.path.join(directory, constants.JOURNAL_FILE_NAME)
+        self.snapshot_path: str = os.path.join(directory, constants.SNAPSHOT_FILE_NAME)
+
+        self.compact_every: int = compact_every
+        self.records_since_snapshot: int = 0
+        self.generation: int = 0
+        self.journal_matches_snapshot: bool = False
+
+        self.queue: queue.Queue = queue.Queue()
+        self.writer: Optional[threading.Thread] = None
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[List[Any]]]:
+        snapshot = None
+
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+            self.generation = snapshot['generation']
+        except (OSError, ValueError, KeyError, TypeError):
+            snapshot = None
+
+        records = []
+
+        try:
+            with open(self.journal_path, encoding='utf-8') as file:
+                lines = file.read().splitlines()
+        except OSError:
+            lines = []
+
+        if lines:
+            try:
+                header = json.loads(lines[0])
+            except ValueError:
+                header = None
+
+            if isinstance(header, dict) and header.get('generation') == self.generation:
+                self.journal_matches_snapshot = True
+
+                for line in lines[1:]:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A line cut off by a crash, everything before it is intact
+                        break
+
+        self.records_since_snapshot = len(records)
+        return snapshot, records
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        if not self.journal_matches_snapshot:
+            self.start_new_journal_file(self.generation).close()
+            self.journal_matches_snapshot = True
+
+        self.writer = threading.Thread(target=self.write_loop, name='journal-writer', daemon=True)
+        self.writer.start()
+
+    def start_new_journal_file(self, generation: int) -> TextIO:
+        with open(self.journal_path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'generation': generation}) + '\n')
+        os.replace(self.journal_path + '.tmp', self.journal_path)
+
+        return open(self.journal_path, 'a', encoding='utf-8')
+
+    def append(self, record: List[Any]) -> None:
+        self.queue.put(('record', record))
+        self.records_since_snapshot += 1
+
+    def needs_compaction(self) -> bool:
+        return self.records_since_snapshot >= self.compact_every
+
+    def compact(self, snapshot: Dict[str, Any]) -> None:
+        self.generation += 1
+        snapshot['generation'] = self.generation
+
+        self.queue.put(('snapshot', snapshot))
+        self.records_since_snapshot = 0
+
+    def close(self) -> None:
+        if self.writer:
+            self.queue.put(('close', None))
+            self.writer.join()
+            self.writer = None
+
+    def write_loop(self) -> None:
+        journal_file = open(self.journal_path, 'a', encoding='utf-8')
+
+        try:
+            while True:
+                kind, payload = self.queue.get()
+
+                if kind == 'close':
+                    break
+
+                if kind == 'record':
+                    journal_file.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+                elif kind == 'snapshot':
+                    write_json_atomically(self.snapshot_path, payload)
+                    journal_file.close()
+                    journal_file = self.start_new_journal_file(payload['generation'])
+
+                if self.queue.empty():
+                    journal_file.flush()
+
+        finally:
+            journal_file.close()
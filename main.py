@@ -1,13 +1,211 @@
+import time
+
+STARTUP_TIME = time.perf_counter()
+
+import argparse
+import os
 import pygame
 import bricks
+import constants
+import profiling
+import useful
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Scratch with Python3')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='print how long each startup phase took, up to the first frame')
+    parser.add_argument('--workspace', action='append',
+                        help='directory a workspace is autosaved to and restored from, give it again to open '
+                             'more workspaces in tabs; --run and --export use the first one')
+    parser.add_argument('--no-autosave', action='store_true',
+                        help='start with an empty workspace and do not save anything')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='run the asyncio main loop, which loads the workspace progressively and writes '
+                             'files off the frame loop')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the input events of this session to FILE')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a recorded session headlessly as fast as possible and print phase timings')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='keep a ring buffer of executed bricks, dumped to FILE on runtime errors and on F9')
+    parser.add_argument('--frame-metrics', metavar='FILE',
+                        help='write rolling frame phase percentiles to FILE, as a JSON array for .json, JSON lines '
+                             'for .jsonl, else CSV')
+    parser.add_argument('--recursion-limit', type=int, default=constants.RECURSION_LIMIT,
+                        help='how many procedure calls may be nested, tail calls do not count')
+    parser.add_argument('--metrics-port', metavar='PORT', type=int,
+                        help='serve live counters as Prometheus text on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--run', action='store_true',
+                        help='run the scripts of the saved workspace without a window, checkpointing regularly; '
+                             'Ctrl+C pauses after a last checkpoint')
+    parser.add_argument('--resume', metavar='FILE',
+                        help='continue the program saved in checkpoint FILE, with --run or in the editor '
+                             '(the editor does not autosave a resumed workspace)')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        default=os.path.join(useful.user_data_dir(), constants.CHECKPOINT_FILE_NAME),
+                        help='where checkpoints are written, by --run and by F6 in the editor')
+    parser.add_argument('--checkpoint-every', metavar='SECONDS', type=float, default=constants.CHECKPOINT_EVERY,
+                        help='how often --run writes a checkpoint')
+    parser.add_argument('--export', metavar='FILE',
+                        help='export the saved workspace to a standalone Python module and check it '
+                             'against the interpreter')
+
+    arguments = parser.parse_args()
+    if not arguments.workspace:
+        arguments.workspace = [os.path.join(useful.user_data_dir(), 'workspace')]
+
+    return arguments
+
+
+def init_headless() -> None:
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.display.init()
+    pygame.font.init()
+
+
+def run_export(workspace: str, path: str) -> None:
+    import exporter
+    import journal
+
+    init_headless()
+
+    app = bricks.App(1280, 720, 60, edit_journal=journal.EditJournal(workspace))
+    if not app.restore_workspace():
+        print('Nothing saved in', workspace)
+        return
+    app.update_blocks()
+
+    python_exporter = exporter.PythonExporter(app)
+    code = python_exporter.export()
+
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(code)
+    print('Exported to', path)
+
+    for description in python_exporter.unsupported:
+        print('Unsupported:', description)
+
+    if python_exporter.unsupported:
+        print('Not checked, the workspace uses blocks the exporter does not support')
+        return
+
+    matches = exporter.compare_with_interpreter(app, code)
+    if matches is None:
+        print('Not checked, the interpreter did not finish')
+    else:
+        print('Output matches the interpreter' if matches else 'Output DIFFERS from the interpreter')
+
+
+def run_replay(path: str) -> None:
+    import replay
+
+    init_headless()
+
+    app = bricks.App(1280, 720, 60)
+
+    start = time.perf_counter()
+    replay.replay(app, path)
+    elapsed = time.perf_counter() - start
+
+    print('Replayed {} frames in {:.1f} ms'.format(app.frame_number, elapsed * 1000))
+    print(app.phase_timer.summary())
+
+
+def run_program(arguments) -> None:
+    import checkpoint
+    import journal
+
+    init_headless()
+
+    if arguments.resume:
+        app = bricks.App(1280, 720, 60)
+        app.restore_checkpoint(checkpoint.read_checkpoint(arguments.resume))
+    else:
+        app = bricks.App(1280, 720, 60, edit_journal=journal.EditJournal(arguments.workspace[0]))
+        if not app.restore_workspace():
+            print('Nothing saved in', arguments.workspace[0])
+            return
+        app.triggered_events.append(constants.TriggeredEvent.SPACE_PRESSED_EVENT)
+
+    app.recursion_limit = arguments.recursion_limit
+
+    if not checkpoint.run_to_completion(app, arguments.checkpoint, arguments.checkpoint_every):
+        print('Paused, continue with --run --resume', arguments.checkpoint)
 
 
 def main():
-    pygame.init()
+    arguments = parse_arguments()
+
+    if arguments.replay:
+        run_replay(arguments.replay)
+        return
+
+    if arguments.export:
+        run_export(arguments.workspace[0], arguments.export)
+        return
+
+    if arguments.run:
+        run_program(arguments)
+        return
+
+    startup_profiler = None
+    if arguments.startup_profile:
+        startup_profiler = profiling.StartupProfiler(STARTUP_TIME)
+        startup_profiler.mark('imports')
+
+    # Only the subsystems the editor uses are started, pygame.init() would also
+    # bring up audio, joysticks etc.
+    pygame.display.init()
     pygame.font.init()
-    pygame.mixer.init()
 
-    bricks.App(1280, 720, 60).run()
+    if startup_profiler:
+        startup_profiler.mark('pygame init')
+
+    # Modules behind the flags are imported only when their flag is given
+    edit_journal = None
+    if not arguments.no_autosave and not arguments.resume:
+        import journal
+        edit_journal = journal.EditJournal(arguments.workspace[0])
+
+    event_recorder = None
+    if arguments.record:
+        import replay
+        event_recorder = replay.EventRecorder(arguments.record)
+
+    tracer = None
+    if arguments.trace:
+        import tracing
+        tracer = tracing.ExecutionTracer(arguments.trace)
+
+    app = bricks.App(1280, 720, 60, startup_profiler, edit_journal, event_recorder, tracer)
+    app.recursion_limit = arguments.recursion_limit
+    app.checkpoint_path = arguments.checkpoint
+
+    if edit_journal:
+        for directory in arguments.workspace[1:]:
+            app.add_workspace(journal.EditJournal(directory))
+
+    if arguments.metrics_port is not None:
+        # http.server is only loaded when the endpoint is asked for
+        import metrics_server
+
+        app.metrics_server = metrics_server.MetricsServer(arguments.metrics_port)
+        app.metrics_server.start()
+        print('Metrics on http://127.0.0.1:{}/metrics'.format(app.metrics_server.port))
+
+    if arguments.resume:
+        import checkpoint
+        app.restore_checkpoint(checkpoint.read_checkpoint(arguments.resume))
+
+    if arguments.frame_metrics:
+        app.frame_metrics_writer = profiling.FrameMetricsWriter(arguments.frame_metrics)
+
+    if arguments.asyncio:
+        import asyncio
+        asyncio.run(app.run_async())
+    else:
+        app.run()
 
 
 if __name__ == '__main__':
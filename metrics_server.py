@@ -0,0 +1,72 @@
+from typing import *
+
+import http.server
+import threading
+
+# metric name, labels, value
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def format_samples(samples: Sequence[Sample]) -> str:
+    lines = []
+
+    for name, labels, value in samples:
+        if labels:
+            label_text = ','.join('{}="{}"'.format(key, label) for key, label in labels.items())
+            lines.append('{}{{{}}} {}'.format(name, label_text, value))
+        else:
+            lines.append('{} {}'.format(name, value))
+
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = format_samples(self.server.samples).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Scrapers come every few seconds, their requests are not worth a console line
+        pass
+
+
+class MetricsServer:
+    # Serves the last published samples as Prometheus text on
+    # http://127.0.0.1:<port>/metrics. The app only swaps in a new list a few
+    # times per second, requests are answered on their own thread and never
+    # touch the app.
+
+    def __init__(self, port: int, host: str = '127.0.0.1'):
+        self.http_server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.http_server.daemon_threads = True
+        self.http_server.samples = []
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.http_server.server_address[1]
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.http_server.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+
+    def publish(self, samples: List[Sample]) -> None:
+        self.http_server.samples = samples
+
+    def close(self) -> None:
+        if self.thread:
+            self.http_server.shutdown()
+            self.thread.join()
+            self.thread = None
+
+        self.http_server.server_close()
@@ -0,0 +1,191 @@
+from typing import *
+
+import constants
+import itertools
+import pygame
+
+
+class Minimap:
+    # The whole workspace scaled down into a cached surface. Only top level
+    # blocks reported as changed are erased and drawn again, at most
+    # MINIMAP_BLOCKS_PER_FRAME blocks per frame, the rest waits for the next
+    # frames. Drawn rectangles are kept in a coarse grid, so erasing one finds
+    # the neighbours it uncovered without looking at every block.
+
+    def __init__(self, app):
+        self.app = app
+        self.rect: pygame.Rect = pygame.Rect(app.width - constants.MINIMAP_WIDTH - constants.MINIMAP_MARGIN,
+                                             app.height - constants.MINIMAP_HEIGHT - constants.MINIMAP_MARGIN,
+                                             constants.MINIMAP_WIDTH, constants.MINIMAP_HEIGHT)
+        self.surface: pygame.Surface = pygame.Surface(self.rect.size)
+
+        # The part of the workspace the minimap shows, and its scale
+        self.world: pygame.Rect = pygame.Rect(0, 0, app.width, app.height)
+        self.scale: float = 1
+
+        self.drawn: Dict[int, Tuple[Any, pygame.Rect]] = {}
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        # Changed roots are erased and drawn again, roots that were only
+        # uncovered by an erase are drawn again over the erased area
+        self.dirty: Dict[int, Any] = {}
+        self.uncovered: Dict[int, Any] = {}
+        self.removed_ids: Set[int] = set()
+        self.needs_rebuild: bool = True
+
+        # The root being drawn and the rest of its subtree, a large one is
+        # drawn over several frames
+        self.drawing: Optional[Tuple[Any, Iterator[Any]]] = None
+
+    def mark_dirty(self, block) -> None:
+        self.removed_ids.discard(id(block))
+        self.dirty[id(block)] = block
+
+    def mark_removed(self, block) -> None:
+        self.removed_ids.add(id(block))
+        self.dirty[id(block)] = block
+
+    def reset(self) -> None:
+        self.needs_rebuild = True
+
+    def has_pending_work(self) -> bool:
+        return bool(self.dirty or self.uncovered) or self.needs_rebuild or self.drawing is not None
+
+    def pan(self, dx: int, dy: int) -> None:
+        # Everything moved together, so the picture stays, only the view moves on it
+        self.world.move_ip(dx, dy)
+
+    def to_minimap(self, rect: pygame.Rect) -> pygame.Rect:
+        return pygame.Rect(int((rect.x - self.world.x) * self.scale), int((rect.y - self.world.y) * self.scale),
+                           max(int(rect.width * self.scale), 1), max(int(rect.height * self.scale), 1))
+
+    def to_world(self, x: int, y: int) -> Tuple[int, int]:
+        return (int((x - self.rect.x) / self.scale) + self.world.x,
+                int((y - self.rect.y) / self.scale) + self.world.y)
+
+    def is_cursor_inside(self, x: int, y: int) -> bool:
+        return self.rect.collidepoint(x, y)
+
+    def get_cells(self, rect: pygame.Rect) -> Iterator[Tuple[int, int]]:
+        size = constants.MINIMAP_CELL_SIZE
+
+        for cell_x in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cell_y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield cell_x, cell_y
+
+    def rebuild(self) -> None:
+        # The only step that looks at all blocks, needed when the workspace
+        # outgrows the picture
+        roots = [block for block in self.app.blocks if block.owner is None]
+
+        world = pygame.Rect(0, 0, self.app.width, self.app.height)
+        world = world.unionall([root.full_content_rect for root in roots]) if roots else world
+        self.world = world.inflate(world.width // 4, world.height // 4)
+        self.scale = min(self.rect.width / self.world.width, self.rect.height / self.world.height)
+
+        self.surface.fill(constants.MINIMAP_BACKGROUND_COLOR)
+        self.drawn = {}
+        self.cells = {}
+        self.removed_ids = set()
+        self.dirty = {id(root): root for root in roots}
+        self.uncovered = {}
+        self.needs_rebuild = False
+        self.drawing = None
+
+    def erase(self, key: int) -> None:
+        if key not in self.drawn:
+            return
+
+        _, rect = self.drawn.pop(key)
+        self.surface.fill(constants.MINIMAP_BACKGROUND_COLOR, rect)
+
+        for cell in self.get_cells(rect):
+            self.cells[cell].discard(key)
+
+            for other_key in self.cells[cell]:
+                other_root, other_rect = self.drawn[other_key]
+                if not other_rect.colliderect(rect) or other_key in self.dirty:
+                    continue
+
+                if self.drawing is not None and self.drawing[0] is other_root:
+                    # Partly drawn already, the erase may have cleared some of it
+                    self.drawing = (other_root, other_root.iterate_subtree())
+                else:
+                    self.uncovered[other_key] = other_root
+
+    def start_drawing(self, root) -> None:
+        if not self.world.contains(root.full_content_rect):
+            self.needs_rebuild = True
+            return
+
+        rect = self.to_minimap(root.full_content_rect).clip(self.surface.get_rect())
+        self.drawn[id(root)] = (root, rect)
+
+        for cell in self.get_cells(rect):
+            self.cells.setdefault(cell, set()).add(id(root))
+
+        self.uncovered.pop(id(root), None)
+        self.drawing = (root, root.iterate_subtree())
+
+    def continue_drawing(self, budget: int) -> int:
+        _, blocks = self.drawing
+
+        for block in itertools.islice(blocks, budget):
+            self.surface.fill(block.color, self.to_minimap(block))
+            budget -= 1
+
+        if budget > 0:
+            self.drawing = None
+
+        return budget
+
+    def update(self) -> None:
+        if self.needs_rebuild:
+            self.rebuild()
+
+        budget = constants.MINIMAP_BLOCKS_PER_FRAME
+
+        while budget > 0 and not self.needs_rebuild:
+            if self.drawing is not None:
+                # A root changed again while being drawn is drawn anew from its dirty entry
+                if id(self.drawing[0]) in self.dirty:
+                    self.drawing = None
+                else:
+                    budget = self.continue_drawing(budget)
+                    continue
+
+            if not self.dirty:
+                if not self.uncovered:
+                    break
+
+                # Drawn where it already was, nothing is erased, so nothing
+                # else gets uncovered
+                key = next(iter(self.uncovered))
+                root = self.uncovered.pop(key)
+                if key in self.drawn:
+                    self.drawing = (root, root.iterate_subtree())
+                else:
+                    budget -= 1
+                continue
+
+            key = next(iter(self.dirty))
+            block = self.dirty.pop(key)
+            self.erase(key)
+
+            if key in self.removed_ids:
+                self.removed_ids.discard(key)
+                budget -= 1
+            elif block.owner is not None:
+                # Now part of another subtree, which is drawn as a whole
+                self.mark_dirty(block.get_root())
+                budget -= 1
+            else:
+                self.start_drawing(block)
+
+    def draw(self, surface: pygame.Surface) -> None:
+        self.update()
+
+        surface.blit(self.surface, self.rect)
+        pygame.draw.rect(surface, constants.MINIMAP_BORDER_COLOR, self.rect, 1)
+
+        view = self.to_minimap(pygame.Rect(0, 0, self.app.width, self.app.height)).move(self.rect.topleft)
+        pygame.draw.rect(surface, constants.MINIMAP_VIEW_COLOR, view.clip(self.rect), 1)
@@ -0,0 +1,96 @@
+from typing import *
+
+import collections
+import constants
+import pygame
+
+
+class BlockPool:
+    # Deleted blocks are kept here, detached from the app, and handed out again
+    # instead of building a new block with all of its fonts and spots
+
+    def __init__(self, app):
+        self.app = app
+        self.free_blocks: DefaultDict[type, List[Any]] = collections.defaultdict(list)
+
+    def acquire(self, block_type: type, x: int, y: int):
+        if self.free_blocks[block_type]:
+            block = self.free_blocks[block_type].pop()
+            block.recycle(x, y)
+            block.register()
+            return block
+
+        return block_type(self.app, x, y)
+
+    def release(self, block) -> None:
+        block.unregister()
+        self.free_blocks[block.__class__].append(block)
+
+    def clear(self) -> None:
+        self.free_blocks.clear()
+
+
+class PaletteEntry:
+
+    def __init__(self, block_type: type):
+        self.block_type: type = block_type
+        self.preview: Optional[pygame.Surface] = None
+        self.rect: pygame.Rect = pygame.Rect(0, 0, 0, 0)
+
+
+class Palette:
+    # Every block type is shown from one cached preview surface. The block the
+    # preview was drawn from goes to the pool, so the first drag out of an entry
+    # does not build anything either.
+
+    def __init__(self, app, block_types: Sequence[type]):
+        self.app = app
+        self.entries: List[PaletteEntry] = [PaletteEntry(block_type) for block_type in block_types]
+        self.rect: pygame.Rect = pygame.Rect(0, 0, constants.PALETTE_WIDTH, app.height)
+        self.scroll: int = 0
+
+    def render_preview(self, entry: PaletteEntry) -> pygame.Surface:
+        block = entry.block_type(self.app, 0, 0)
+        block.update_all()
+
+        preview = pygame.Surface(block.full_content_rect.size, pygame.SRCALPHA, 32)
+        block.draw(preview, False)
+
+        self.app.block_pool.release(block)
+        return preview
+
+    def layout(self) -> None:
+        # Previews are rendered only once their entry scrolls into view
+        y = constants.PALETTE_MARGIN - self.scroll
+
+        for entry in self.entries:
+            if entry.preview is None:
+                if y > self.rect.bottom:
+                    entry.rect = pygame.Rect(constants.PALETTE_MARGIN, y, 0, 0)
+                    continue
+
+                entry.preview = self.render_preview(entry)
+
+            entry.rect = entry.preview.get_rect(topleft=(constants.PALETTE_MARGIN, y))
+            y = entry.rect.bottom + constants.PALETTE_MARGIN
+
+    def scroll_by(self, dy: int) -> None:
+        self.scroll = max(0, self.scroll + dy)
+
+    def is_cursor_inside(self, x: int, y: int) -> bool:
+        return self.rect.collidepoint(x, y)
+
+    def get_entry_at(self, x: int, y: int) -> Optional[PaletteEntry]:
+        for entry in self.entries:
+            if entry.preview is not None and entry.rect.collidepoint(x, y):
+                return entry
+
+        return None
+
+    def draw(self, surface: pygame.Surface) -> None:
+        self.layout()
+        pygame.draw.rect(surface, constants.PALETTE_BACKGROUND_COLOR, self.rect)
+
+        for entry in self.entries:
+            if entry.preview is not None and entry.rect.colliderect(self.rect):
+                surface.blit(entry.preview, entry.rect)
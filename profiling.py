@@ -0,0 +1,147 @@
+from typing import *
+
+import collections
+import contextlib
+import json
+import time
+
+REPORTED_PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class StartupProfiler:
+
+    def __init__(self, start_time: Optional[float] = None):
+        self.start_time: float = time.perf_counter() if start_time is None else start_time
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, phase_name: str) -> None:
+        self.marks.append((phase_name, time.perf_counter()))
+
+    def report(self) -> str:
+        lines = ['Startup profile:']
+        previous = self.start_time
+
+        for phase_name, moment in self.marks:
+            lines.append('  {:<24} {:8.1f} ms  (total {:8.1f} ms)'.format(
+                phase_name, (moment - previous) * 1000, (moment - self.start_time) * 1000))
+            previous = moment
+
+        return '\n'.join(lines)
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    if not sorted_samples:
+        return 0.0
+
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
+
+
+class PhaseTimer:
+
+    def __init__(self, window: Optional[int] = None):
+        self.window: Optional[int] = window
+        self.samples: Dict[str, Deque[float]] = {}
+
+    @contextlib.contextmanager
+    def phase(self, phase_name: str) -> Iterator[None]:
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_sample(phase_name, time.perf_counter() - start)
+
+    def add_sample(self, phase_name: str, seconds: float) -> None:
+        if phase_name not in self.samples:
+            self.samples[phase_name] = collections.deque(maxlen=self.window)
+
+        self.samples[phase_name].append(seconds)
+
+    def summary(self) -> str:
+        lines = ['{:<12} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9}'.format(
+            'phase', 'frames', 'total ms', 'mean ms', 'p50 ms', 'p95 ms', 'max ms')]
+
+        for phase_name, samples in self.samples.items():
+            ordered = sorted(samples)
+            lines.append('{:<12} {:>8} {:>10.1f} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}'.format(
+                phase_name, len(ordered), sum(ordered) * 1000, sum(ordered) / len(ordered) * 1000,
+                percentile(ordered, 0.5) * 1000, percentile(ordered, 0.95) * 1000, ordered[-1] * 1000))
+
+        return '\n'.join(lines)
+
+    def percentiles(self, phase_name: str, fractions: Sequence[float]) -> List[float]:
+        ordered = sorted(self.samples.get(phase_name, ()))
+        return [percentile(ordered, fraction) for fraction in fractions]
+
+
+class IdleTracker:
+    # A loop at full rate would have spent one frame of work every 1 / fps
+    # seconds of the time spent waiting idle, that work is what was saved
+
+    def __init__(self, start_time: float):
+        self.start_time: float = start_time
+        self.idle_time: float = 0
+
+    def add_wait(self, seconds: float) -> None:
+        self.idle_time += seconds
+
+    def idle_fraction(self, now: float) -> float:
+        return self.idle_time / max(now - self.start_time, 1e-9)
+
+    def saved_cpu_time(self, fps: int, frame_cost: float) -> float:
+        return self.idle_time * fps * frame_cost
+
+    def report(self, now: float, fps: int, frame_cost: float) -> str:
+        return 'Idle {:.0%} of {:.1f} s, about {:.2f} s of CPU saved'.format(
+            self.idle_fraction(now), now - self.start_time, self.saved_cpu_time(fps, frame_cost))
+
+
+class FrameMetricsWriter:
+    # Appends one row per phase with its rolling percentiles, as CSV, as JSON
+    # lines for a .jsonl file name, or as one JSON array for a .json file name.
+    # The array is closed by close(), until then the file is not valid JSON.
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.is_json_array: bool = path.endswith('.json')
+        self.is_json: bool = self.is_json_array or path.endswith('.jsonl')
+        self.file: TextIO = open(path, 'w', encoding='utf-8')
+        self.row_count: int = 0
+
+        if self.is_json_array:
+            self.file.write('[')
+        elif not self.is_json:
+            self.file.write('time,phase,p50_ms,p95_ms,p99_ms\n')
+
+    def format_rows(self, elapsed: float, phase_timer: PhaseTimer) -> str:
+        rows = []
+
+        for phase_name in phase_timer.samples:
+            p50, p95, p99 = (value * 1000 for value in phase_timer.percentiles(phase_name, REPORTED_PERCENTILES))
+
+            if self.is_json:
+                row = json.dumps({'time': round(elapsed, 3), 'phase': phase_name, 'p50_ms': round(p50, 3),
+                                  'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)})
+                if self.is_json_array:
+                    row = ('\n' if self.row_count == 0 else ',\n') + row
+                else:
+                    row += '\n'
+                rows.append(row)
+                self.row_count += 1
+            else:
+                rows.append('{:.3f},{},{:.3f},{:.3f},{:.3f}\n'.format(elapsed, phase_name, p50, p95, p99))
+
+        return ''.join(rows)
+
+    def write_rows(self, rows: str) -> None:
+        self.file.write(rows)
+        self.file.flush()
+
+    def write(self, elapsed: float, phase_timer: PhaseTimer) -> None:
+        self.write_rows(self.format_rows(elapsed, phase_timer))
+
+    def close(self) -> None:
+        if self.is_json_array:
+            self.file.write('\n]\n')
+        self.file.close()
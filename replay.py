@@ -0,0 +1,114 @@
+from typing import *
+
+import json
+import struct
+import profiling
+import pygame
+
+RECORDING_MAGIC = b'SCRATCHREC1\n'
+HEADER_FORMAT = struct.Struct('<I')
+# frame number, event type and up to four integer event attributes
+EVENT_FORMAT = struct.Struct('<IHiiii')
+
+RECORDED_EVENT_TYPES = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION,
+                        pygame.MOUSEWHEEL, pygame.KEYDOWN)
+
+
+def encode_event(event: pygame.event.Event) -> Tuple[int, int, int, int]:
+    if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return event.pos[0], event.pos[1], event.button, 0
+
+    if event.type == pygame.MOUSEMOTION:
+        return event.pos[0], event.pos[1], event.rel[0], event.rel[1]
+
+    if event.type == pygame.MOUSEWHEEL:
+        return event.x, event.y, 0, 0
+
+    if event.type == pygame.KEYDOWN:
+        return event.key, getattr(event, 'mod', 0), 0, 0
+
+    return 0, 0, 0, 0
+
+
+def decode_event(event_type: int, a: int, b: int, c: int, d: int) -> pygame.event.Event:
+    if event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return pygame.event.Event(event_type, pos=(a, b), button=c)
+
+    if event_type == pygame.MOUSEMOTION:
+        return pygame.event.Event(event_type, pos=(a, b), rel=(c, d), buttons=(0, 0, 0))
+
+    if event_type == pygame.MOUSEWHEEL:
+        return pygame.event.Event(event_type, x=a, y=b)
+
+    if event_type == pygame.KEYDOWN:
+        return pygame.event.Event(event_type, key=a, mod=b)
+
+    return pygame.event.Event(event_type)
+
+
+class EventRecorder:
+    # The recording starts with a snapshot of the workspace, so that a replay
+    # begins from exactly the blocks the session was recorded on
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.file: Optional[BinaryIO] = None
+
+    def start(self, snapshot: Dict[str, Any]) -> None:
+        header = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+
+        self.file = open(self.path, 'wb')
+        self.file.write(RECORDING_MAGIC)
+        self.file.write(HEADER_FORMAT.pack(len(header)))
+        self.file.write(header)
+
+    def record(self, frame_number: int, event: pygame.event.Event) -> None:
+        # Events before start() came while the workspace was loading and were
+        # ignored by the app, a replay starts from the loaded workspace anyway
+        if self.file is not None and event.type in RECORDED_EVENT_TYPES:
+            self.file.write(EVENT_FORMAT.pack(frame_number, event.type, *encode_event(event)))
+
+    def close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def read_recording(path: str) -> Tuple[Dict[str, Any], Dict[int, List[pygame.event.Event]]]:
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if not data.startswith(RECORDING_MAGIC):
+        raise ValueError('{} is not an input recording'.format(path))
+
+    offset = len(RECORDING_MAGIC)
+    header_length, = HEADER_FORMAT.unpack_from(data, offset)
+    offset += HEADER_FORMAT.size
+
+    snapshot = json.loads(data[offset: offset + header_length].decode('utf-8'))
+    offset += header_length
+
+    events_by_frame: Dict[int, List[pygame.event.Event]] = {}
+
+    for frame_number, event_type, *attributes in EVENT_FORMAT.iter_unpack(data[offset:]):
+        events_by_frame.setdefault(frame_number, []).append(decode_event(event_type, *attributes))
+
+    return snapshot, events_by_frame
+
+
+def replay(app, path: str) -> None:
+    snapshot, events_by_frame = read_recording(path)
+    app.load_workspace(snapshot, [])
+    app.phase_timer = profiling.PhaseTimer()
+
+    drawable = pygame.Surface((app.width, app.height), pygame.SRCALPHA, 32)
+    drawable_transparent = pygame.Surface((app.width, app.height), pygame.SRCALPHA, 32)
+
+    last_frame = max(events_by_frame, default=-1)
+
+    try:
+        while app.frame_number <= last_frame:
+            app.step_frame(events_by_frame.get(app.frame_number, []), drawable, drawable_transparent)
+
+    except app.QuitException:
+        pass
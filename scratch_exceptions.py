@@ -22,3 +22,13 @@ class EmptyArgumentException(ScratchRuntimeException):
 class InvalidNumberException(ScratchRuntimeException):
     def __init__(self):
         super().__init__('Invalid number')
+
+
+class UnknownProcedureException(ScratchRuntimeException):
+    def __init__(self, procedure_name):
+        super().__init__(f'Unknown procedure {procedure_name}')
+
+
+class RecursionLimitException(ScratchRuntimeException):
+    def __init__(self, recursion_limit):
+        super().__init__(f'Recursion deeper than {recursion_limit} calls')
@@ -0,0 +1,151 @@
+from typing import *
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import bricks
+import exporter
+
+
+def setUpModule():
+    pygame.display.init()
+    pygame.font.init()
+
+
+def tearDownModule():
+    pygame.quit()
+
+
+class ExporterTest(unittest.TestCase):
+    # Every program is exported, run, and its output compared with what the
+    # interpreter prints for the same workspace
+
+    def setUp(self):
+        self.app = bricks.App(1280, 720, 60)
+
+    def spawn(self, block_type: Type[bricks.Block]) -> bricks.Block:
+        return self.app.spawn_block(block_type, 0, 0)
+
+    def number(self, text: str) -> bricks.NumberBlock:
+        block = self.spawn(bricks.NumberBlock)
+        block.text = text
+        return block
+
+    def variable(self, text: str) -> bricks.VariableNameBlock:
+        block = self.spawn(bricks.VariableNameBlock)
+        block.text = text
+        return block
+
+    def operation(self, block_type: Type[bricks.Block], left: bricks.Block, right: bricks.Block) -> bricks.Block:
+        block = self.spawn(block_type)
+        block.left_spot.insert(left)
+        block.right_spot.insert(right)
+        return block
+
+    def assign(self, var_name: str, value: Optional[bricks.Block]) -> bricks.AssignIntBrick:
+        brick = self.spawn(bricks.AssignIntBrick)
+        brick.variable_spot.insert(self.variable(var_name))
+        if value is not None:
+            brick.int_spot.insert(value)
+        return brick
+
+    def print_brick(self, value: Optional[bricks.Block]) -> bricks.PrintBrick:
+        brick = self.spawn(bricks.PrintBrick)
+        if value is not None:
+            brick.spot.insert(value)
+        return brick
+
+    def script(self, *script_bricks: bricks.Block) -> bricks.Block:
+        event_brick = self.spawn(bricks.PressSPACEEventBrick)
+
+        previous = event_brick
+        for brick in script_bricks:
+            previous.next_spot.insert(brick)
+            previous = brick
+
+        return event_brick
+
+    def export_and_compare(self, expected_output: List[str]) -> exporter.PythonExporter:
+        self.app.update_blocks()
+
+        python_exporter = exporter.PythonExporter(self.app)
+        code = python_exporter.export()
+
+        self.assertEqual(exporter.normalize_output(exporter.run_exported(code)), expected_output)
+        self.assertIs(exporter.compare_with_interpreter(self.app, code), True)
+
+        return python_exporter
+
+    def test_assign_while_print(self):
+        loop = self.spawn(bricks.WhileBrick)
+        loop.condition_spot.insert(self.operation(bricks.IntLessIntBlock, self.number('i'), self.number('3')))
+        increment = self.assign('i', self.operation(bricks.IntPlusIntBlock, self.number('i'), self.number('1')))
+        increment.next_spot.insert(self.print_brick(
+            self.operation(bricks.IntMultiplyIntBlock, self.number('i'), self.number('i'))))
+        loop.true_spot.insert(increment)
+
+        self.script(self.assign('i', self.number('0')), loop)
+
+        python_exporter = self.export_and_compare(['PRINT: 1', 'PRINT: 4', 'PRINT: 9'])
+        self.assertEqual(python_exporter.unsupported, [])
+
+    def test_if_else(self):
+        condition = self.spawn(bricks.ConditionBrick)
+        condition.condition_spot.insert(self.operation(bricks.IntGreaterIntBlock, self.number('x'), self.number('5')))
+        condition.true_spot.insert(self.print_brick(self.number('1')))
+        condition.false_spot.insert(self.print_brick(self.number('2')))
+
+        without_else = self.spawn(bricks.ConditionWithoutElseBrick)
+        without_else.condition_spot.insert(self.operation(bricks.IntEqualIntBlock, self.number('x'), self.number('7')))
+        without_else.true_spot.insert(self.print_brick(self.number('3')))
+
+        self.script(self.assign('x', self.number('7')), condition, without_else)
+
+        python_exporter = self.export_and_compare(['PRINT: 1', 'PRINT: 3'])
+        self.assertEqual(python_exporter.unsupported, [])
+
+    def test_empty_arguments(self):
+        self.script(self.print_brick(self.number('1')), self.print_brick(None), self.print_brick(self.number('2')))
+        self.script(self.assign('y', None))
+
+        self.export_and_compare(['PRINT: 1', 'Error', 'Error'])
+
+    def test_unknown_variable(self):
+        self.script(self.print_brick(self.operation(bricks.IntPlusIntBlock, self.number('z'), self.number('1'))))
+
+        self.export_and_compare(['Error'])
+
+    def test_division_by_zero(self):
+        self.script(self.print_brick(self.operation(bricks.IntDivIntBlock, self.number('1'), self.number('0'))),
+                    self.print_brick(self.number('1')))
+        self.script(self.print_brick(self.operation(bricks.IntModIntBlock, self.number('1'), self.number('0'))))
+        self.script(self.print_brick(self.number('2')))
+
+        self.export_and_compare(['Error', 'Error', 'PRINT: 2'])
+
+    def test_unsupported_brick(self):
+        wait = self.spawn(bricks.WaitBrick)
+        self.script(self.print_brick(self.number('1')), wait)
+
+        python_exporter = self.export_and_compare(['PRINT: 1', 'Error'])
+        self.assertEqual(python_exporter.unsupported, ['WaitBrick (block {})'.format(wait.block_id)])
+
+    def test_sleeping_scripts_are_not_checked(self):
+        every = self.spawn(bricks.EveryBrick)
+        every.interval_spot.insert(self.number('10'))
+        every.true_spot.insert(self.print_brick(self.number('1')))
+        self.script(every)
+        self.app.update_blocks()
+
+        python_exporter = exporter.PythonExporter(self.app)
+        code = python_exporter.export()
+
+        self.assertEqual(python_exporter.unsupported, ['EveryBrick (block {})'.format(every.block_id)])
+        self.assertIsNone(exporter.compare_with_interpreter(self.app, code))
+
+
+if __name__ == '__main__':
+    unittest.main()
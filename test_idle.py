@@ -0,0 +1,56 @@
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import bricks
+
+
+def setUpModule():
+    pygame.display.init()
+    pygame.font.init()
+
+
+def tearDownModule():
+    pygame.quit()
+
+
+class IdleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = bricks.App(1280, 720, 60)
+        self.drawable = pygame.Surface((self.app.width, self.app.height), pygame.SRCALPHA, 32)
+        self.drawable_transparent = pygame.Surface((self.app.width, self.app.height), pygame.SRCALPHA, 32)
+
+    def frames_until_idle(self, max_frames: int = 20) -> int:
+        for frames in range(1, max_frames + 1):
+            self.app.step_frame([], self.drawable, self.drawable_transparent)
+
+            if self.app.is_idle():
+                return frames
+
+        self.fail('still not idle after {} frames'.format(max_frames))
+
+    def test_empty_workspace_is_idle(self):
+        self.assertEqual(self.frames_until_idle(), 1)
+
+    def test_overlapping_roots_settle(self):
+        first = self.app.spawn_block(bricks.PrintBrick, 300, 300)
+        self.app.spawn_block(bricks.PrintBrick, 310, 305)
+        self.frames_until_idle()
+
+        first.relative_move(5, 5)
+        self.assertFalse(self.app.is_idle())
+        self.frames_until_idle()
+
+    def test_pending_script_is_not_idle(self):
+        self.app.spawn_block(bricks.PressSPACEEventBrick, 300, 300)
+        self.frames_until_idle()
+
+        self.app.triggered_events.append(bricks.constants.TriggeredEvent.SPACE_PRESSED_EVENT)
+        self.assertFalse(self.app.is_idle())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+from typing import *
+
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import bricks
+
+
+def setUpModule():
+    pygame.display.init()
+    pygame.font.init()
+
+
+def tearDownModule():
+    pygame.quit()
+
+
+class MinimapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = bricks.App(1280, 720, 60)
+        self.minimap = self.app.minimap
+
+    def settle(self, max_updates: int = 20) -> int:
+        for updates in range(1, max_updates + 1):
+            self.minimap.update()
+
+            if not self.minimap.has_pending_work():
+                return updates
+
+        self.fail('the minimap still has work after {} updates'.format(max_updates))
+
+    def spawn_overlapping(self) -> Tuple[bricks.Block, bricks.Block]:
+        first = self.app.spawn_block(bricks.PrintBrick, 300, 300)
+        second = self.app.spawn_block(bricks.PrintBrick, 310, 305)
+        self.app.update_blocks()
+
+        self.assertTrue(first.full_content_rect.colliderect(second.full_content_rect))
+        return first, second
+
+    def test_moving_an_overlapping_root_settles(self):
+        first, second = self.spawn_overlapping()
+        self.settle()
+
+        first.relative_move(5, 5)
+        self.settle()
+
+        second.relative_move(-20, 0)
+        self.settle()
+
+        self.assertEqual(set(self.minimap.drawn), {id(first), id(second)})
+
+
+if __name__ == '__main__':
+    unittest.main()
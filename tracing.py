@@ -0,0 +1,120 @@
+from typing import *
+
+import json
+import struct
+import sys
+
+TRACE_MAGIC = b'SCRATCHTRACE1\n'
+HEADER_FORMAT = struct.Struct('<I')
+# step number, brick id, record kind, variable name index, value
+RECORD_FORMAT = struct.Struct('<QIBHq')
+
+KIND_STEP = 0
+KIND_BRANCH = 1
+KIND_WRITE = 2
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+DEFAULT_CAPACITY = 1 << 16
+
+
+class ExecutionTracer:
+    # Records are packed straight into a preallocated buffer, once it is full the
+    # oldest records are overwritten, so memory stays fixed however long it runs
+
+    def __init__(self, dump_path: str, capacity: int = DEFAULT_CAPACITY):
+        self.dump_path: str = dump_path
+        self.capacity: int = capacity
+        self.buffer: bytearray = bytearray(RECORD_FORMAT.size * capacity)
+
+        self.records_written: int = 0
+        self.step: int = 0
+
+        self.variable_names: List[str] = []
+        self.variable_name_indexes: Dict[str, int] = {}
+
+    def record(self, kind: int, brick_id: int, name_index: int, value: int) -> None:
+        offset = self.records_written % self.capacity * RECORD_FORMAT.size
+        RECORD_FORMAT.pack_into(self.buffer, offset, self.step, brick_id, kind, name_index,
+                                min(max(value, INT64_MIN), INT64_MAX))
+        self.records_written += 1
+
+    def record_step(self, brick) -> None:
+        self.step += 1
+        self.record(KIND_STEP, brick.block_id, 0, 0)
+
+    def record_branch(self, brick, taken: bool) -> None:
+        self.record(KIND_BRANCH, brick.block_id, 0, int(taken))
+
+    def record_write(self, brick, var_name: str, value: int) -> None:
+        if var_name not in self.variable_name_indexes:
+            self.variable_name_indexes[var_name] = len(self.variable_names)
+            self.variable_names.append(var_name)
+
+        self.record(KIND_WRITE, brick.block_id, self.variable_name_indexes[var_name], value)
+
+    def ordered_records(self) -> bytes:
+        if self.records_written <= self.capacity:
+            return bytes(self.buffer[:self.records_written * RECORD_FORMAT.size])
+
+        split = self.records_written % self.capacity * RECORD_FORMAT.size
+        return bytes(self.buffer[split:] + self.buffer[:split])
+
+    def serialize(self) -> bytes:
+        header = json.dumps({'variable_names': self.variable_names,
+                             'records_written': self.records_written}).encode('utf-8')
+
+        return TRACE_MAGIC + HEADER_FORMAT.pack(len(header)) + header + self.ordered_records()
+
+    def dump(self, path: Optional[str] = None) -> str:
+        return write_dump(path or self.dump_path, self.serialize())
+
+
+def write_dump(path: str, data: bytes) -> str:
+    with open(path, 'wb') as file:
+        file.write(data)
+
+    return path
+
+
+def read_trace(path: str) -> Tuple[Dict[str, Any], List[Tuple[int, int, int, int, int]]]:
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError('{} is not an execution trace'.format(path))
+
+    offset = len(TRACE_MAGIC)
+    header_length, = HEADER_FORMAT.unpack_from(data, offset)
+    offset += HEADER_FORMAT.size
+
+    header = json.loads(data[offset: offset + header_length].decode('utf-8'))
+    offset += header_length
+
+    return header, list(RECORD_FORMAT.iter_unpack(data[offset:]))
+
+
+def format_record(header: Dict[str, Any], record: Tuple[int, int, int, int, int]) -> str:
+    step, brick_id, kind, name_index, value = record
+
+    if kind == KIND_STEP:
+        return '{:>10}  brick {}'.format(step, brick_id)
+
+    if kind == KIND_BRANCH:
+        return '{:>10}  brick {} branch {}'.format(step, brick_id, 'taken' if value else 'not taken')
+
+    return '{:>10}  brick {} {} := {}'.format(step, brick_id, header['variable_names'][name_index], value)
+
+
+def main(paths: List[str]) -> None:
+    for path in paths:
+        header, records = read_trace(path)
+        print('{}: {} records kept of {} written'.format(path, len(records), header['records_written']))
+
+        for record in records:
+            print(format_record(header, record))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
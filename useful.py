@@ -1,6 +1,7 @@
 from typing import *
 
 import colorsys
+import os
 import scratch_exceptions
 import pygame
 import re
@@ -71,3 +72,30 @@ class ColorGenerator:
 
 
 color_generator = ColorGenerator(0.8, 1)
+
+
+def user_cache_dir() -> str:
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') \
+           or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'scratch')
+
+
+def user_data_dir() -> str:
+    base = os.environ.get('APPDATA') or os.environ.get('XDG_DATA_HOME') \
+           or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'scratch')
+
+
+# pygame rects compare equal by their coordinates, these helpers look for the very same object
+
+
+def index_by_identity(items: List[Any], item: Any) -> int:
+    for index, candidate in enumerate(items):
+        if candidate is item:
+            return index
+
+    raise ValueError('item is not in the list')
+
+
+def remove_by_identity(items: List[Any], item: Any) -> None:
+    del items[index_by_identity(items, item)]
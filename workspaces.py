@@ -0,0 +1,92 @@
+from typing import *
+
+import os
+import constants
+import pygame
+
+
+class Workspace:
+    # While inactive a workspace exists only as its compressed checkpoint, its
+    # blocks and their rendered surfaces are given up on every switch
+
+    def __init__(self, name: str, edit_journal=None):
+        self.name: str = name
+        self.edit_journal = edit_journal
+        self.saved_state: Optional[bytes] = None
+
+        self.label: Optional[pygame.Surface] = None
+        self.rect: pygame.Rect = pygame.Rect(0, 0, 0, 0)
+
+
+def get_workspace_name(directory: Optional[str], index: int) -> str:
+    if directory is None:
+        return 'Workspace {}'.format(index + 1)
+
+    return os.path.basename(os.path.normpath(directory))
+
+
+def get_new_workspace_directory(base_directory: str, used_directories: Sequence[str]) -> str:
+    # Next to the first workspace, so it can be opened again with --workspace
+    used = {os.path.normpath(directory) for directory in used_directories}
+    n = 2
+
+    while True:
+        directory = '{}-{}'.format(os.path.normpath(base_directory), n)
+        if directory not in used and not os.path.exists(directory):
+            return directory
+        n += 1
+
+
+class TabBar:
+
+    def __init__(self, app):
+        self.app = app
+        self.rect: pygame.Rect = pygame.Rect(constants.PALETTE_WIDTH, 0, app.width - constants.PALETTE_WIDTH,
+                                             constants.TAB_BAR_HEIGHT)
+        self.new_tab_label: Optional[pygame.Surface] = None
+        self.new_tab_rect: pygame.Rect = pygame.Rect(0, 0, 0, 0)
+
+    def render_label(self, text: str) -> pygame.Surface:
+        return self.app.default_in_block_font.render(text, True, constants.HUD_TEXT_COLOR)
+
+    def layout(self, workspaces: Sequence[Workspace]) -> None:
+        x = self.rect.x + constants.TAB_MARGIN
+
+        for workspace in workspaces:
+            if workspace.label is None:
+                workspace.label = self.render_label(workspace.name)
+
+            workspace.rect = pygame.Rect(x, self.rect.y, workspace.label.get_width() + 2 * constants.TAB_MARGIN,
+                                         self.rect.height)
+            x = workspace.rect.right + constants.TAB_MARGIN
+
+        if self.new_tab_label is None:
+            self.new_tab_label = self.render_label('+')
+
+        self.new_tab_rect = pygame.Rect(x, self.rect.y, self.new_tab_label.get_width() + 2 * constants.TAB_MARGIN,
+                                        self.rect.height)
+
+    def is_cursor_inside(self, x: int, y: int) -> bool:
+        return self.rect.collidepoint(x, y)
+
+    def get_tab_at(self, workspaces: Sequence[Workspace], x: int, y: int) -> Optional[int]:
+        for i, workspace in enumerate(workspaces):
+            if workspace.rect.collidepoint(x, y):
+                return i
+
+        return None
+
+    def is_new_tab_button(self, x: int, y: int) -> bool:
+        return self.new_tab_rect.collidepoint(x, y)
+
+    def draw(self, surface: pygame.Surface, workspaces: Sequence[Workspace], active_index: int) -> None:
+        self.layout(workspaces)
+        pygame.draw.rect(surface, constants.PALETTE_BACKGROUND_COLOR, self.rect)
+
+        for i, workspace in enumerate(workspaces):
+            color = constants.ACTIVE_TAB_COLOR if i == active_index else constants.INACTIVE_TAB_COLOR
+            pygame.draw.rect(surface, color, workspace.rect)
+            surface.blit(workspace.label, workspace.label.get_rect(center=workspace.rect.center))
+
+        pygame.draw.rect(surface, constants.INACTIVE_TAB_COLOR, self.new_tab_rect)
+        surface.blit(self.new_tab_label, self.new_tab_label.get_rect(center=self.new_tab_rect.center))